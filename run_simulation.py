@@ -3,7 +3,8 @@
 """
 
 from sic_bo_simulator import SicBoSimulator
-import random
+from sic_bo_estimators import ESTIMATORS, estimate_rtp
+import numpy as np
 
 def main():
     # 建立模擬器實例
@@ -45,17 +46,46 @@ def main():
     for x in range(1, 7):
         print(f"{x}_HI: {result['x_hi'][x]}")
     
-    # 模擬隨機賠率
+    # 模擬隨機賠率 (依賠率表的倍數權重，未指定時為均勻分佈)
     print("\n隨機賠率示例:")
-    print("1_LO隨機高倍賠率:", random.choice([1.8, 3, 5, 10, 15]))
-    print("單骰點數出現1次隨機高倍賠率:", random.choice([1, 2, 3]))
-    print("雙骰組合隨機高倍賠率:", random.choice([5, 10, 15, 25, 40]))
+    table = simulator.settlement_table
+    rng = np.random.default_rng()
+    codes = rng.integers(0, 216, 100000)
+    exact = simulator.calculate_exact_expected_value()
+    for bet_type, selection in [("1_LO_隨機高倍", None), ("單骰點數_隨機高倍", 1), ("雙骰組合_隨機高倍", "1,2")]:
+        bet_id = table.bet_id(bet_type, selection)
+        # 整批結果代碼一次抽出倍數
+        returns = table.sample(codes, bet_id, rng)
+        values = exact[bet_type] if selection is None else exact[bet_type][selection]
+        name = bet_type if selection is None else f"{bet_type} [{selection}]"
+        print(f"{name}: 中獎時的賠率 {(returns[returns > 0][:5] - 1).tolist()}, "
+              f"模擬期望值 {returns.mean():.4f} / 精確 {values['expected_value']:.4f}, "
+              f"變異數 {returns.var():.4f} / 精確 {values['variance']:.4f}")
     
-    # 執行多次模擬
-    print("\n進行模擬計算中...")
-    simulations = 20000
-    simulator.simulate_multiple_rolls(simulations)
-    print(f"完成 {simulations} 次模擬")
+    # 精確計算 (216 種等機率結果)
+    print()
+    simulator.print_exact_results()
+    
+    # 執行多次模擬 (蒙地卡羅交叉驗證)
+    print("\n進行模擬計算中 (與精確值交叉驗證)...")
+    # 分批模擬直到 HI/LO/11 的RTP信賴區間半寬不超過 0.005
+    adaptive = simulator.simulate_until(tolerance=0.005, bets=["高 (HI)", "低 (LO)", "11 HI-LO"],
+                                        batch_size=20000, max_rolls=5_000_000)
+    print(f"完成 {adaptive['rolls']} 次模擬 ({'已達到' if adaptive['converged'] else '未達到'}要求的精確度)")
+    for name, estimate in adaptive["estimates"].items():
+        print(f"{name} RTP: {estimate['rtp']:.4f} ± {estimate['half_width']:.4f} (95% 信賴區間)")
+    
+    stats = simulator.calculate_statistics()
+    exact_stats = simulator.calculate_exact_statistics()
+    for key in ["高 (HI)", "低 (LO)", "11 HI-LO", "三同點"]:
+        print(f"{key}: 模擬 {stats[key]:.4f} / 精確 {exact_stats[key]:.4f}")
+    
+    # 變異數縮減估計: 相同投擲數下的標準誤比較
+    print("\n變異數縮減估計 (21600 次投擲):")
+    for method in ESTIMATORS:
+        estimate = estimate_rtp(21600, method, bets=["1_LO_隨機高倍"])["estimates"]["1_LO_隨機高倍"]
+        print(f"1_LO_隨機高倍 [{method}]: RTP {estimate['rtp']:.4f} ± {estimate['half_width']:.4f}, "
+              f"變異數縮減倍數 {estimate['vrf']:.2f}")
     
     # 印出統計結果
     print("\n統計結果:")
@@ -0,0 +1,237 @@
+"""
+骰寶模擬紀錄封存 - 以欄位式二進位陣列保存模擬結果，重新開啟時以記憶體映射讀取
+
+封存為一個目錄:
+- meta.json: 格式版本、種類 (rolls / players)、seed、賠率表、賠率表版本與模擬參數
+- codes.npy: 投擲結果代碼 (uint8，rolls 為一維，players 為 玩家數 x 局數)
+- bets.npy / winnings.npy / capital.npy: 每位玩家每局的押注、獲獎與局後資金 (float64，僅 players)
+- games_played.npy: 每位玩家實際進行的局數 (int64，僅 players)
+
+陣列以 np.load(mmap_mode="r") 開啟，統計時分段讀取，數 GB 的封存也不需要整個載入記憶體。
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from sic_bo_simulator import (CompactRollHistory, RollAccumulator, SicBoSimulator, encode_dice,
+                              paytable_version)
+
+ARCHIVE_FORMAT_VERSION = 1
+
+# 統計時每次讀取的投擲次數
+ARCHIVE_CHUNK_SIZE = 10_000_000
+
+PLAYER_ARRAYS = ("bets", "winnings", "capital")
+
+
+def _paytable_to_json(bet_types):
+    return {name: {key: value for key, value in info.items()} for name, info in bet_types.items()}
+
+
+def _paytable_from_json(bet_types):
+    """JSON 物件的鍵為字串，把單骰點數依出現次數的賠率與權重轉回整數鍵"""
+    def restore(value):
+        if isinstance(value, dict):
+            return {int(key) if str(key).isdigit() else key: value for key, value in value.items()}
+        return value
+    return {name: {key: restore(value) if key in ("payout", "weights") else value for key, value in info.items()}
+            for name, info in bet_types.items()}
+
+
+def _write_meta(path, kind, bet_types, seed, params, shapes):
+    meta = {
+        "format_version": ARCHIVE_FORMAT_VERSION,
+        "kind": kind,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": seed,
+        "paytable": _paytable_to_json(bet_types),
+        "paytable_version": paytable_version(bet_types),
+        "params": params,
+        "shapes": shapes,
+    }
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def save_rolls(path, codes=None, simulator=None, seed=None, params=None):
+    """封存一串投擲結果代碼
+
+    codes 未指定時取自 simulator 的歷史 (壓縮歷史直接使用結果代碼，一般歷史逐局編碼)。
+    賠率表取自 simulator (未指定時使用預設賠率表)。
+    """
+    simulator = simulator if simulator is not None else SicBoSimulator()
+    if codes is None:
+        history = simulator.results_history
+        if isinstance(history, CompactRollHistory):
+            codes = history.codes
+        else:
+            codes = np.fromiter((encode_dice(result["dice"]) for result in history), dtype=np.uint8,
+                                count=len(history))
+    codes = np.asarray(codes, dtype=np.uint8)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "codes.npy"), codes)
+    _write_meta(path, "rolls", simulator.bet_types, seed, params or {}, {"codes": list(codes.shape)})
+    return open_archive(path)
+
+
+class RollArchiveWriter:
+    """逐段寫入投擲結果代碼的封存，codes.npy 以記憶體映射檔預先配置"""
+
+    def __init__(self, path, num_rolls, bet_types=None, seed=None, params=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.position = 0
+        self.codes = np.lib.format.open_memmap(os.path.join(path, "codes.npy"), mode="w+", dtype=np.uint8,
+                                               shape=(num_rolls,))
+        bet_types = bet_types if bet_types is not None else SicBoSimulator().bet_types
+        _write_meta(path, "rolls", bet_types, seed, params or {}, {"codes": [num_rolls]})
+
+    def append(self, codes):
+        """寫入一段結果代碼並寫回磁碟，已寫入的分頁可由作業系統釋放"""
+        self.codes[self.position:self.position + len(codes)] = codes
+        self.position += len(codes)
+        self.codes.flush()
+
+    def close(self):
+        self.codes.flush()
+        return open_archive(self.path)
+
+
+class PlayerArchiveWriter:
+    """逐段寫入玩家模擬結果的封存，陣列以記憶體映射檔預先配置，記憶體用量只與一段玩家有關"""
+
+    def __init__(self, path, num_players, num_games, bet_types=None, seed=None, params=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.num_players = num_players
+        self.position = 0
+        shape = (num_players, num_games)
+        open_memmap = np.lib.format.open_memmap
+        self.codes = open_memmap(os.path.join(path, "codes.npy"), mode="w+", dtype=np.uint8, shape=shape)
+        self.arrays = {name: open_memmap(os.path.join(path, f"{name}.npy"), mode="w+", dtype=np.float64, shape=shape)
+                       for name in PLAYER_ARRAYS}
+        self.games_played = open_memmap(os.path.join(path, "games_played.npy"), mode="w+", dtype=np.int64,
+                                        shape=(num_players,))
+        bet_types = bet_types if bet_types is not None else SicBoSimulator().bet_types
+        _write_meta(path, "players", bet_types, seed, params or {}, {"codes": list(shape)})
+
+    def append(self, codes, arrays):
+        """加入一段玩家: codes 為結果代碼矩陣，arrays 為 simulate_bankrolls 的結果"""
+        rows = slice(self.position, self.position + len(codes))
+        self.codes[rows] = codes
+        for name in PLAYER_ARRAYS:
+            self.arrays[name][rows] = arrays[name]
+        self.games_played[rows] = arrays["games_played"]
+        self.position = rows.stop
+
+    def close(self):
+        for array in (self.codes, self.games_played, *self.arrays.values()):
+            array.flush()
+        return open_archive(self.path)
+
+
+class RunArchive:
+    """以記憶體映射開啟的封存；陣列在第一次讀取時才映射"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] > ARCHIVE_FORMAT_VERSION:
+            raise ValueError(f"不支援的封存格式版本: {self.meta['format_version']}")
+        self.kind = self.meta["kind"]
+        self.bet_types = _paytable_from_json(self.meta["paytable"])
+        self._arrays = {}
+
+    def _array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    @property
+    def codes(self):
+        return self._array("codes")
+
+    @property
+    def bets(self):
+        return self._array("bets")
+
+    @property
+    def winnings(self):
+        return self._array("winnings")
+
+    @property
+    def capital(self):
+        return self._array("capital")
+
+    @property
+    def games_played(self):
+        return self._array("games_played")
+
+    def _iter_code_chunks(self, chunk_size=ARCHIVE_CHUNK_SIZE):
+        """分段讀取實際進行的投擲結果代碼 (玩家封存不含破產後的局數)"""
+        codes = self.codes
+        if self.kind == "rolls":
+            for start in range(0, len(codes), chunk_size):
+                yield np.asarray(codes[start:start + chunk_size])
+            return
+        rows_per_chunk = max(1, chunk_size // max(codes.shape[1], 1))
+        columns = np.arange(codes.shape[1])
+        for start in range(0, len(codes), rows_per_chunk):
+            block = np.asarray(codes[start:start + rows_per_chunk])
+            played = np.asarray(self.games_played[start:start + rows_per_chunk])
+            yield block[columns < played[:, None]]
+
+    def accumulator(self, chunk_size=ARCHIVE_CHUNK_SIZE):
+        """把封存的投擲結果累計為 RollAccumulator"""
+        accumulator = RollAccumulator()
+        for codes in self._iter_code_chunks(chunk_size):
+            accumulator.add_codes(codes)
+        return accumulator
+
+    def simulator(self, chunk_size=ARCHIVE_CHUNK_SIZE):
+        """以封存的賠率表與投擲結果建立模擬器，可直接呼叫 calculate_statistics / calculate_expected_value"""
+        simulator = SicBoSimulator()
+        simulator.bet_types = self.bet_types
+        simulator.accumulator = self.accumulator(chunk_size)
+        return simulator
+
+    def statistics(self, chunk_size=ARCHIVE_CHUNK_SIZE):
+        """與 calculate_statistics 相同格式的統計資訊"""
+        return self.accumulator(chunk_size).statistics()
+
+    def player_summary(self, chunk_size=ARCHIVE_CHUNK_SIZE):
+        """玩家封存的整體RTP與每位玩家的總押注、總獲獎與最終資金 (分段計算)"""
+        if self.kind != "players":
+            raise ValueError("只有玩家封存有玩家資料")
+        num_players, num_games = self.codes.shape
+        rows_per_chunk = max(1, chunk_size // max(num_games, 1))
+        total_bets = np.empty(num_players)
+        total_wins = np.empty(num_players)
+        final_capital = np.empty(num_players)
+        initial_capital = self.meta["params"].get("initial_capital", 0)
+        for start in range(0, num_players, rows_per_chunk):
+            rows = slice(start, start + rows_per_chunk)
+            total_bets[rows] = np.asarray(self.bets[rows]).sum(axis=1)
+            total_wins[rows] = np.asarray(self.winnings[rows]).sum(axis=1)
+            played = np.asarray(self.games_played[rows])
+            capital = np.asarray(self.capital[rows])
+            last = np.take_along_axis(capital, np.maximum(played - 1, 0)[:, None], axis=1)[:, 0]
+            final_capital[rows] = np.where(played > 0, last, initial_capital)
+        total_bet = float(total_bets.sum())
+        return {
+            "overall_rtp": float(total_wins.sum()) / total_bet if total_bet > 0 else 0,
+            "total_bet": total_bets,
+            "total_win": total_wins,
+            "final_capital": final_capital,
+            "games_played": np.asarray(self.games_played),
+        }
+
+
+def open_archive(path):
+    """以記憶體映射開啟封存"""
+    return RunArchive(path)
@@ -0,0 +1,191 @@
+"""
+骰寶資金精確分析 - 以馬可夫鏈計算固定押注下的破產機率與最終資金分佈
+
+資金以最小單位 (tick) 表示為格點，每局的轉移由押注回收倍數的精確分佈決定：
+資金不低於押注金額時押注固定金額，資金不足時全押，資金歸零即破產 (吸收狀態)。
+結果與 simulate_multiple_players 的規則相同，但不需要抽樣。
+"""
+
+import math
+from fractions import Fraction
+
+import numpy as np
+
+from sic_bo_simulator import SicBoSimulator, settlement_table
+
+# 格點數上限，超過時拋出 ValueError
+MAX_STATES = 20_000_000
+
+# 每次計算的格點運算次數上限 (約 4 秒)，超過時拋出 ValueError；MAX_STATES 只限制格點數，不限制局數
+MAX_WORK = 2_000_000_000
+
+# 賠率轉為分數時的最大分母
+MAX_DENOMINATOR = 10_000
+
+# 機率低於 float64 最小正規數 (約 e^-708) 的格點視為 0，避免次正規數拖慢運算並讓下尾不斷延伸
+TINY = np.finfo(np.float64).tiny
+
+# 上述門檻在常態近似下對應的標準差倍數
+UNDERFLOW_SIGMAS = math.sqrt(-2 * math.log(TINY))
+
+
+def _fraction(value):
+    return Fraction(value).limit_denominator(MAX_DENOMINATOR)
+
+
+def _fraction_gcd(values):
+    """多個分數的最大公因數"""
+    denominator = math.lcm(*(value.denominator for value in values))
+    numerator = math.gcd(*(int(value * denominator) for value in values))
+    return Fraction(numerator, denominator)
+
+
+def estimated_work(num_games, capital_ticks, bet_ticks, steps, probabilities, tail_tolerance):
+    """估計精確計算的格點運算次數
+
+    第 g 局的非零格點範圍以常態近似估計: 上尾到 tail_tolerance 對應的標準差倍數，
+    下尾到機率低於 TINY 的位置，並以最大漲跌與破產 (資金 0) 為界。
+    每局對每個格點做 (回收倍數種類 + 4) 次運算 (平移相加，以及配置、找非零範圍與上尾累計)。
+    """
+    steps = np.asarray(steps, dtype=float)
+    probabilities = np.asarray(probabilities, dtype=float)
+    mean = float(steps @ probabilities)
+    sigma = math.sqrt(max(float((steps - mean) ** 2 @ probabilities), 0.0))
+    upper_sigmas = math.sqrt(2 * math.log(1 / tail_tolerance)) if tail_tolerance else math.inf
+    games = np.arange(1, num_games + 1)
+    spread = np.sqrt(games) * sigma
+    center = capital_ticks + games * mean
+    with np.errstate(invalid="ignore"):
+        high = np.minimum(capital_ticks + games * steps.max(), center + upper_sigmas * spread)
+    low = np.maximum(np.maximum(capital_ticks + games * steps.min(), center - UNDERFLOW_SIGMAS * spread), 0)
+    widths = np.maximum(high - low, 0) + bet_ticks + 1
+    return float(widths.sum()) * (len(steps) + 4)
+
+
+def exact_bankroll_distribution(num_games, bet_amount, initial_capital, bet_type, selection=None,
+                                bet_types=None, tail_tolerance=1e-15):
+    """固定押注下資金的精確分佈
+
+    返回破產機率 (ruin_probability)、每局結束時的累計破產機率 (ruin_by_game)、
+    最終資金分佈 (final_capital)、期望最終資金、期望遊戲局數與期望總押注。
+    機率低於 tail_tolerance 的資金上尾格點會被捨去，捨去的總機率記錄在 truncated_mass；
+    全押時若資金乘以回收倍數不在格點上，機率會分給相鄰兩個格點 (保持期望值)，此時 lattice_exact 為 False。
+    """
+    bet_types = bet_types if bet_types is not None else SicBoSimulator().bet_types
+    table = settlement_table(bet_types)
+    returns, probabilities = table.return_distribution(table.bet_id(bet_type, selection))
+
+    # 以押注金額、起始資金與每局淨輸贏的最大公因數作為格點單位
+    bet = _fraction(bet_amount)
+    capital = _fraction(initial_capital)
+    multipliers = [_fraction(value) for value in returns]
+    tick = _fraction_gcd([bet, capital] + [bet * (m - 1) for m in multipliers if m != 1])
+    bet_ticks = int(bet / tick)
+    steps = np.array([int(bet * (m - 1) / tick) for m in multipliers])
+    max_step = max(int(steps.max()), 0)
+    min_step = min(int(steps.min()), 0)
+    max_states = int(capital / tick) + num_games * max_step + 1
+    if max_states > MAX_STATES:
+        raise ValueError(f"資金狀態數過多 ({max_states})，請減少局數或調整押注金額")
+    work = estimated_work(num_games, int(capital / tick), bet_ticks, steps, probabilities, tail_tolerance)
+    if work > MAX_WORK:
+        raise ValueError(f"精確計算量過大 (約 {work:.1e} 次格點運算)，請減少局數或調整押注金額")
+
+    # window 為格點 low..high 的機率 (不含破產)，破產機率另外累計
+    low = high = int(capital / tick)
+    window = np.ones(1)
+    ruined = 0.0
+    ruin_by_game = []
+    expected_games = 0.0
+    expected_bet = 0.0
+    truncated = 0.0
+    lattice_exact = True
+
+    for _ in range(num_games):
+        if not len(window):
+            ruin_by_game.append(min(float(ruined), 1.0))
+            continue
+        expected_games += 1.0 - ruined
+        # 本局結束後的格點範圍為 base..high + max_step (全押時可能落到 0)
+        base = 0 if low < bet_ticks else low + min_step
+        new = np.zeros(high + max_step + 2 - base)
+
+        # 固定押注: 資金 >= 押注金額，資金平移 (回收倍數 - 1) x 押注金額
+        flat_low = max(low, bet_ticks)
+        if flat_low <= high:
+            flat = window[flat_low - low:]
+            expected_bet += flat.sum() * float(bet)
+            for step, probability in zip(steps, probabilities):
+                new[flat_low + step - base:high + 1 + step - base] += probability * flat
+
+        # 全押: 0 < 資金 < 押注金額，資金乘以回收倍數
+        if low < bet_ticks:
+            index = np.arange(low, min(high, bet_ticks - 1) + 1)
+            mass = window[:len(index)]
+            expected_bet += float((mass * index).sum()) * float(tick)
+            for multiplier, probability in zip(returns, probabilities):
+                target = index * multiplier
+                lower = np.floor(target + 1e-9).astype(np.int64)
+                fraction = target - lower
+                if np.any(fraction[mass > 0] > 1e-9):
+                    lattice_exact = False
+                fraction = np.where(fraction > 1e-9, fraction, 0.0)
+                np.add.at(new, lower, probability * mass * (1 - fraction))
+                upper = fraction > 0
+                np.add.at(new, lower[upper] + 1, probability * mass[upper] * fraction[upper])
+
+        if base == 0:
+            ruined += new[0]
+            new[0] = 0
+
+        # 捨去機率極小的上尾格點
+        nonzero = np.flatnonzero(new >= TINY)
+        if len(nonzero):
+            first, last = int(nonzero[0]), int(nonzero[-1])
+            if tail_tolerance:
+                tail = np.cumsum(new[last:first:-1])
+                cut = int(np.searchsorted(tail, tail_tolerance, side="right"))
+                if cut:
+                    truncated += float(tail[cut - 1])
+                    last -= cut
+            window = new[first:last + 1]
+            low, high = base + first, base + last
+        else:
+            window = new[:0]
+        ruin_by_game.append(min(float(ruined), 1.0))
+
+    support = np.flatnonzero(window)
+    values = (low + support) * float(tick)
+    final_probabilities = window[support]
+    if ruined > 0:
+        values = np.concatenate([[0.0], values])
+        final_probabilities = np.concatenate([[ruined], final_probabilities])
+    expected_final = float((values * final_probabilities).sum())
+    return {
+        "mode": "exact",
+        "num_games": num_games,
+        "bet_amount": bet_amount,
+        "initial_capital": initial_capital,
+        "bet_type": bet_type,
+        "selection": selection,
+        "ruin_probability": min(float(ruined), 1.0),
+        "ruin_by_game": ruin_by_game,
+        "final_capital": {
+            "values": values.tolist(),
+            "probabilities": final_probabilities.tolist(),
+        },
+        "expected_final_capital": expected_final,
+        "expected_games_played": expected_games,
+        "expected_total_bet": expected_bet,
+        "tick": float(tick),
+        "truncated_mass": truncated,
+        "lattice_exact": lattice_exact,
+    }
+
+
+def capital_quantiles(result, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    """由 exact_bankroll_distribution 的最終資金分佈計算分位數"""
+    values = np.asarray(result["final_capital"]["values"])
+    cumulative = np.cumsum(result["final_capital"]["probabilities"])
+    cumulative /= cumulative[-1]
+    return {q: float(values[min(np.searchsorted(cumulative, q), len(values) - 1)]) for q in quantiles}
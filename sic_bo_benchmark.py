@@ -0,0 +1,268 @@
+"""
+骰寶模擬器效能測試 - 量測模擬器與網頁熱點路徑的吞吐量、延遲分位數與峰值記憶體
+
+用法:
+    python sic_bo_benchmark.py                         # 執行並印出結果
+    python sic_bo_benchmark.py --save baseline.json    # 儲存為基準
+    python sic_bo_benchmark.py --compare baseline.json # 與基準比較，有退步時結束代碼為 1
+    python sic_bo_benchmark.py --quick                 # 縮小規模 (開發時快速檢查)
+
+基準檔與機器有關，請在同一台機器上產生與比較。
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from sic_bo_simulator import SicBoSimulator
+
+# 比較基準時允許的變動比例 (相對時間或記憶體增加超過此比例視為退步)
+DEFAULT_THRESHOLD = 0.2
+
+# 每個項目至少量測的總秒數 (與 timeit.autorange 相同，短的項目會多執行幾次；約 100 ms 的項目執行約 10 次)
+MIN_BENCHMARK_SECONDS = 1.0
+
+# 每個項目最多執行的次數
+MAX_REPEAT = 10_000
+
+# 每次執行的時間差距小於此毫秒數時不視為退步 (計時雜訊)
+NOISE_FLOOR_MS = 0.5
+
+# 量測期間每隔此秒數重新執行一次校準工作 (見 _calibration_seconds)
+CALIBRATION_INTERVAL = 0.05
+
+
+def _calibration_seconds(rounds=3):
+    """固定的校準工作 (Python 迴圈與 numpy 運算，約 1 ms) 的最短時間
+
+    共用或節能的機器上整台機器的速度會在數秒內變動 30% 以上，最短時間與中位數都無法排除；
+    以每次執行的時間除以相鄰的校準時間 (相對時間) 比較，機器速度的變動會互相抵銷。
+    """
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        total = 0
+        for i in range(20_000):
+            total += i * i
+        values = np.arange(20_000.0)
+        (values * values).sum()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _percentiles(durations):
+    durations = np.asarray(durations)
+    return {
+        "min_ms": float(durations.min() * 1000),
+        "p50_ms": float(np.percentile(durations, 50) * 1000),
+        "p90_ms": float(np.percentile(durations, 90) * 1000),
+        "p99_ms": float(np.percentile(durations, 99) * 1000),
+    }
+
+
+def run_benchmark(name, fn, units, unit="ops", repeat=5, setup=None, min_time=MIN_BENCHMARK_SECONDS):
+    """執行 fn 至少 repeat 次且總時間至少 min_time 秒，量測每次的時間，另外以 tracemalloc 執行一次量測峰值記憶體
+
+    延遲分位數為每次執行 fn 的時間；fn 接收 setup() 的返回值 (未指定 setup 時不傳參數)，
+    units 為每次執行處理的數量 (例如投擲次數)。
+    relative_p50 為每次執行時間 / 最近一次校準時間的中位數，供 compare 使用。
+    """
+    durations = []
+    relative = []
+    calibration, calibrated_at = _calibration_seconds(), time.perf_counter()
+    while len(durations) < MAX_REPEAT and (len(durations) < repeat or sum(durations) < min_time):
+        if time.perf_counter() - calibrated_at >= CALIBRATION_INTERVAL:
+            calibration, calibrated_at = _calibration_seconds(), time.perf_counter()
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        durations.append(time.perf_counter() - start)
+        relative.append(durations[-1] / calibration)
+
+    args = (setup(),) if setup else ()
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(durations)
+    return {
+        "name": name,
+        "unit": unit,
+        "units": units,
+        "repeat": len(durations),
+        "throughput": units * len(durations) / total if total > 0 else float("inf"),
+        **_percentiles(durations),
+        "relative_p50": float(np.median(relative)),
+        "peak_memory_bytes": int(peak),
+    }
+
+
+def _single_roll_benchmark(num_calls):
+    simulator = SicBoSimulator()
+
+    def run():
+        for _ in range(num_calls):
+            simulator.simulate_single_roll()
+        simulator.results_history.clear()
+    return run
+
+
+def _calculate_benchmark(method):
+    """在每次量測前加入一局，量測統計資訊重新計算的時間"""
+    simulator = SicBoSimulator()
+    simulator.simulate_batch_rolls(100_000, rng=np.random.default_rng(0))
+
+    def setup():
+        simulator.simulate_single_roll()
+        return simulator
+    return setup, lambda sim: getattr(sim, method)()
+
+
+def simulator_benchmarks(quick=False, max_rolls=10_000_000):
+    """模擬器的效能測試"""
+    results = [run_benchmark("simulate_single_roll", _single_roll_benchmark(10_000), 10_000, "rolls")]
+
+    sizes = [n for n in (10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7) if n <= (min(max_rolls, 10 ** 5) if quick else max_rolls)]
+    for num_rolls in sizes:
+        # 逐局歷史在大量投擲時佔用過多記憶體，10^6 局以上使用壓縮歷史
+        compact = num_rolls >= 10 ** 6
+        results.append(run_benchmark(
+            f"simulate_multiple_rolls[{num_rolls}{',compact' if compact else ''}]",
+            lambda num_rolls=num_rolls, compact=compact:
+                SicBoSimulator(compact_history=compact).simulate_multiple_rolls(num_rolls),
+            num_rolls, "rolls", repeat=1 if num_rolls >= 10 ** 6 else 3))
+        results.append(run_benchmark(
+            f"simulate_multiple_rolls[{num_rolls},chunked]",
+            lambda num_rolls=num_rolls: SicBoSimulator().simulate_multiple_rolls(
+                num_rolls, chunk_size=1_000_000, rng=np.random.default_rng(0)),
+            num_rolls, "rolls"))
+        results.append(run_benchmark(
+            f"simulate_batch_rolls[{num_rolls}]",
+            lambda num_rolls=num_rolls: SicBoSimulator().simulate_batch_rolls(num_rolls, rng=np.random.default_rng(0)),
+            num_rolls, "rolls"))
+
+    for method in ("calculate_statistics", "calculate_expected_value"):
+        setup, fn = _calculate_benchmark(method)
+        results.append(run_benchmark(method, fn, 1, "calls", repeat=50, setup=setup))
+    return results
+
+
+def web_benchmarks(quick=False):
+    """網頁模擬器的效能測試 (預設為 /simulate 的上限: 1000 位玩家 x 10000 局)"""
+    import sic_bo_web_simulator as web
+
+    num_players, num_games = (100, 1000) if quick else (1000, 10000)
+    params = dict(bet_amount=100, initial_capital=10000, bet_type="高 (HI)", seed=1)
+    results = [
+        run_benchmark("simulate_multiple_players[100x100]",
+                      lambda: web.simulate_multiple_players(100, 100, **params), 100 * 100, "games"),
+        run_benchmark(f"simulate_multiple_players_vectorized[{num_players}x{num_games},no_history]",
+                      lambda: web.simulate_multiple_players_vectorized(num_players, num_games, **params,
+                                                                       include_history=False),
+                      num_players * num_games, "games", repeat=3),
+        run_benchmark(f"aggregate_multiple_players[{num_players}x{num_games}]",
+                      lambda: web.aggregate_multiple_players(num_players, num_games, **params, points=500),
+                      num_players * num_games, "games", repeat=3),
+    ]
+
+    # /simulate 的完整請求 (含 JSON 序列化)，不指定 seed 以避開結果快取
+    client = web.app.test_client()
+    for mode, players, games in (("full", 100, 100), ("aggregate", num_players, min(num_games, 1000))):
+        payload = {"num_players": players, "num_games": games, "bet_amount": 100,
+                   "initial_capital": 10000, "bet_type": "高 (HI)", "mode": mode}
+        response_bytes = []
+
+        def request(payload=payload, response_bytes=response_bytes):
+            response_bytes.append(len(client.post("/simulate", json=payload).get_data()))
+        result = run_benchmark(f"/simulate[{mode},{players}x{games}]", request, players * games, "games", repeat=5)
+        result["response_bytes"] = response_bytes[0]
+        results.append(result)
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, noise_floor_ms=NOISE_FLOOR_MS):
+    """與基準比較，返回退步項目的說明清單
+
+    時間以相對時間的中位數 (relative_p50) 比較，不受整台機器速度變動影響；
+    除了超過 threshold 比例，每次執行的最短時間也必須增加超過 noise_floor_ms 毫秒才視為退步。
+    沒有 relative_p50 的舊基準檔改以 p50 比較。
+    """
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = previous.get(result["name"])
+        if base is None:
+            continue
+        if "relative_p50" in base:
+            if (result["relative_p50"] > base["relative_p50"] * (1 + threshold)
+                    and result["min_ms"] - base["min_ms"] > noise_floor_ms):
+                regressions.append(f"{result['name']}: 相對時間 {base['relative_p50']:.4g} -> "
+                                   f"{result['relative_p50']:.4g} (最短 {base['min_ms']:.3f} -> "
+                                   f"{result['min_ms']:.3f} ms)")
+        elif (result["p50_ms"] > base["p50_ms"] * (1 + threshold)
+              and result["p50_ms"] - base["p50_ms"] > noise_floor_ms):
+            regressions.append(f"{result['name']}: p50 延遲 {base['p50_ms']:.3f} -> {result['p50_ms']:.3f} ms")
+        if result["peak_memory_bytes"] > base["peak_memory_bytes"] * (1 + threshold):
+            regressions.append(f"{result['name']}: 峰值記憶體 {base['peak_memory_bytes']} -> "
+                               f"{result['peak_memory_bytes']} bytes")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'項目':<58} {'吞吐量 (每秒)':>20} {'min ms':>10} {'p50 ms':>10} {'p99 ms':>10} {'峰值記憶體':>10}")
+    for result in results:
+        throughput = f"{result['throughput']:.4g} {result['unit']}"
+        print(f"{result['name']:<60} {throughput:>20} {result['min_ms']:>10.3f} {result['p50_ms']:>10.3f} "
+              f"{result['p99_ms']:>10.3f} "
+              f"{result['peak_memory_bytes'] / 1024 / 1024:>10.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="骰寶模擬器效能測試")
+    parser.add_argument("--quick", action="store_true", help="縮小規模")
+    parser.add_argument("--max-rolls", type=int, default=10_000_000, help="simulate_multiple_rolls 的最大投擲次數")
+    parser.add_argument("--skip-web", action="store_true", help="不執行網頁模擬器的測試")
+    parser.add_argument("--save", help="把結果儲存為基準檔")
+    parser.add_argument("--compare", help="與基準檔比較")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="退步的判斷比例")
+    parser.add_argument("--noise-floor-ms", type=float, default=NOISE_FLOOR_MS, help="時間差距小於此毫秒數時不視為退步")
+    args = parser.parse_args(argv)
+
+    results = simulator_benchmarks(args.quick, args.max_rolls)
+    if not args.skip_web:
+        results += web_benchmarks(args.quick)
+    print_results(results)
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "quick": args.quick,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n已儲存基準: {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold, args.noise_floor_ms)
+        if regressions:
+            print("\n效能退步:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\n與基準相比沒有退步")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+骰寶模擬工作管理 - 在背景工作池執行長時間的模擬，並提供進度查詢與取消
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """工作已被取消"""
+
+
+class Job:
+    """一個背景模擬工作
+
+    工作函式透過 report() 回報進度；工作被取消後，下一次 report() 會拋出 JobCancelled。
+    """
+
+    def __init__(self, job_id, total):
+        self.id = job_id
+        self.status = "queued"  # queued / running / finished / failed / cancelled
+        self.progress = 0
+        self.total = total
+        self.info = {}
+        self.result = None
+        self.result_bytes = 0
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.future = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def done(self):
+        return self.status in ("finished", "failed", "cancelled")
+
+    def report(self, progress, **info):
+        """回報目前進度，可附帶其他資訊 (例如已完成局數)"""
+        if self.cancelled:
+            raise JobCancelled()
+        self.progress = progress
+        self.info.update(info)
+
+    def to_dict(self):
+        """工作狀態 (不含結果)"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "total": self.total,
+            **self.info,
+            "error": self.error,
+            "result_bytes": self.result_bytes,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """以本機工作池執行模擬工作
+
+    工作結果序列化為 JSON (bytes) 保存。已結束的工作最多保留 max_finished 個，
+    結果合計超過 max_result_bytes 時移除最舊的工作，結束超過 result_ttl 秒的工作也會移除；
+    單一結果超過 max_result_bytes 時工作視為失敗，不保留結果。
+    工作只存在於目前的行程，以多個 gunicorn worker 執行時，查詢必須送到建立工作的同一個 worker。
+    """
+
+    def __init__(self, max_workers=2, max_finished=100, max_result_bytes=256 * 1024 * 1024, result_ttl=3600):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sicbo-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_finished = max_finished
+        self.max_result_bytes = max_result_bytes
+        self.result_ttl = result_ttl
+
+    def submit(self, fn, total, *args, **kwargs):
+        """提交工作: fn(job, *args, **kwargs) 的返回值即為工作結果"""
+        job = Job(uuid.uuid4().hex, total)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """取消工作；尚未開始的工作會直接取消，執行中的工作在下一次回報進度時停止"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job._cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, "cancelled")
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            self._finish(job, "cancelled")
+            return
+        job.status = "running"
+        try:
+            result = json.dumps(fn(job, *args, **kwargs), ensure_ascii=False).encode("utf-8")
+        except JobCancelled:
+            self._finish(job, "cancelled")
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, "failed")
+        else:
+            if len(result) > self.max_result_bytes:
+                job.error = f"結果大小 {len(result)} bytes 超過上限 {self.max_result_bytes} bytes"
+                self._finish(job, "failed")
+            else:
+                job.result = result
+                job.result_bytes = len(result)
+                self._finish(job, "finished")
+
+    def _finish(self, job, status):
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+            self._prune()
+
+    def _prune(self):
+        """移除過期的已結束工作，再依數量與結果大小上限移除最舊的已結束工作 (呼叫時須持有鎖)"""
+        now = time.time()
+        finished = []
+        for job_id, job in list(self._jobs.items()):
+            if not job.done:
+                continue
+            if self.result_ttl is not None and now - job.finished_at > self.result_ttl:
+                del self._jobs[job_id]
+            else:
+                finished.append(job_id)
+        total_bytes = sum(self._jobs[job_id].result_bytes for job_id in finished)
+        while finished and (len(finished) > self.max_finished or total_bytes > self.max_result_bytes):
+            total_bytes -= self._jobs.pop(finished.pop(0)).result_bytes
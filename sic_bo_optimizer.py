@@ -0,0 +1,213 @@
+"""
+骰寶賠率表最佳化 - 在賠率候選值的網格中，找出符合各押注類別目標RTP且最接近目前賠率表的候選
+
+每個押注的RTP是賠率的線性函數: RTP = 基本項 + Σ 命中機率 x 賠率，
+因此同一類別的所有候選賠率表可以排成矩陣 (候選 x 賠率參數)，與 (押注 x 賠率參數) 的機率矩陣相乘一次算出全部RTP。
+
+賠率參數:
+- 固定賠率: 賠率本身 (單骰點數依出現次數各一個參數)
+- 隨機倍數清單: 整組倍數的縮放比例 (目前為 1)，單骰點數的各組倍數一起縮放
+"""
+
+import numpy as np
+
+from sic_bo_simulator import SicBoSimulator, bet_category, bet_selections, settlement_table
+
+# 押注類別: 由 bet_category 合併而來，名稱含 "隨機" 的押注另成一類 (加上 _random)
+FAMILY_CATEGORIES = {
+    "hi": "hi_lo", "lo": "hi_lo", "hi_lo_11": "hi_lo",
+    "single": "single", "pair": "pair",
+    "combo_two": "combo", "combo_all": "combo",
+    "x_lo": "x_lo", "x_hi": "x_hi",
+}
+
+# 每個類別最多評估的候選數
+MAX_CANDIDATES = 50_000_000
+
+# 每批展開的候選數
+CANDIDATE_CHUNK_SIZE = 200_000
+
+
+def bet_family(bet_type):
+    """押注類型所屬的類別，例如 "x_lo"、"single_random\""""
+    family = FAMILY_CATEGORIES[bet_category(bet_type)[0]]
+    return f"{family}_random" if "隨機" in bet_type else family
+
+
+def _parameters(bet_types, table, bet_type):
+    """押注類型的賠率參數: [(參數名稱, 目前值, 係數)]
+
+    係數為每單位參數在押注RTP中的貢獻 (命中機率，隨機倍數則再乘上平均倍數)。
+    固定賠率的參數為賠率本身，單骰點數依出現次數各一個參數；隨機倍數的參數為整組倍數的縮放比例。
+    """
+    payout = bet_types[bet_type]["payout"]
+    bet_id = table.bet_id(bet_type, bet_selections(bet_type)[0])
+    hits = table.hits[:, bet_id]
+    by_count = payout if isinstance(payout, dict) else {1: payout}
+    parameters = []
+    scale = 0.0
+    for count, count_payout in by_count.items():
+        probability = float((hits == count).mean()) if isinstance(payout, dict) else float((hits > 0).mean())
+        if isinstance(count_payout, (list, tuple)):
+            # 倍數機率 (含權重) 下的平均倍數
+            scale += probability * float(table.choice_probabilities[bet_id][count] @ (table.choices[bet_id][count] - 1))
+        else:
+            parameters.append(((bet_type, count if isinstance(payout, dict) else None), float(count_payout), probability))
+    if scale:
+        parameters.append(((bet_type, "scale"), 1.0, scale))
+    return parameters
+
+
+def _grid(current, increment, max_change):
+    """目前值附近、為 increment 倍數的候選值 (一定包含目前值，且大於 0)"""
+    steps = np.arange(np.ceil((current - max_change) / increment), np.floor((current + max_change) / increment) + 1)
+    values = np.round(steps * increment, 10)
+    values = np.union1d(values[values > 0], [current])
+    return values
+
+
+def optimize_paytable(targets, bet_types=None, increment=0.05, max_change=1.0, monotone=True, top_k=5,
+                      max_candidates=MAX_CANDIDATES):
+    """搜尋符合目標RTP的賠率表
+
+    targets: {類別: (RTP下限, RTP上限)}，類別中每個押注的RTP都必須落在範圍內
+    increment / max_change: 候選賠率的間距與相對目前值的最大變動，可為單一數值或 {類別: 數值}
+    monotone: 同一類別中，勝率越低的押注賠率不得較低；單骰點數的賠率隨出現次數不遞減
+    返回每個類別最接近目前賠率 (以相對變動的歐氏距離計算) 的 top_k 個可行候選，
+    以及把各類別最佳候選套用到目前賠率表後的完整賠率表 paytable。
+    """
+    bet_types = bet_types if bet_types is not None else SicBoSimulator().bet_types
+    table = settlement_table(bet_types)
+    families = {}
+    for bet_type in bet_types:
+        families.setdefault(bet_family(bet_type), []).append(bet_type)
+    unknown = set(targets) - set(families)
+    if unknown:
+        raise ValueError(f"未知的押注類別: {', '.join(sorted(unknown))}，可用 {', '.join(sorted(families))}")
+
+    paytable = {name: dict(info) for name, info in bet_types.items()}
+    results = {}
+    for family, (low, high) in targets.items():
+        family_increment = increment.get(family, 0.05) if isinstance(increment, dict) else increment
+        family_change = max_change.get(family, 1.0) if isinstance(max_change, dict) else max_change
+        results[family] = _optimize_family(bet_types, table, families[family], low, high, family_increment,
+                                           family_change, monotone, top_k, max_candidates)
+        if results[family]["best"]:
+            _apply_payouts(paytable, results[family]["best"][0]["payouts"])
+    return {"paytable": paytable, "families": results}
+
+
+def _optimize_family(bet_types, table, family_bets, low, high, increment, max_change, monotone, top_k,
+                     max_candidates):
+    parameters = []
+    for bet_type in family_bets:
+        parameters.extend(_parameters(bet_types, table, bet_type))
+    names = [name for name, _, _ in parameters]
+    current = np.array([value for _, value, _ in parameters])
+
+    # 機率矩陣: RTP[押注] = base[押注] + Σ coefficient[押注, 參數] x 參數值
+    coefficient = np.zeros((len(family_bets), len(parameters)))
+    base = np.zeros(len(family_bets))
+    win_probability = np.zeros(len(family_bets))
+    for row, bet_type in enumerate(family_bets):
+        bet_id = table.bet_id(bet_type, bet_selections(bet_type)[0])
+        win_probability[row] = (table.hits[:, bet_id] > 0).mean()
+        for column, ((name_bet, _), _, unit) in enumerate(parameters):
+            if name_bet == bet_type:
+                coefficient[row, column] = unit
+        # 不是參數的部分 (本金) 由結算表的期望回收扣除參數的貢獻
+        base[row] = table.table[:, bet_id].mean() - coefficient[row] @ current
+
+    # 只依賴單一參數的押注可先篩掉RTP不可能在範圍內的候選值
+    grids = []
+    for column, value in enumerate(current):
+        grid = _grid(value, increment, max_change)
+        dependent = np.flatnonzero(coefficient[:, column])
+        if len(dependent) == 1 and np.count_nonzero(coefficient[dependent[0]]) == 1:
+            rtp = base[dependent[0]] + coefficient[dependent[0], column] * grid
+            grid = grid[(rtp >= low) & (rtp <= high)]
+        grids.append(grid)
+
+    sizes = [len(grid) for grid in grids]
+    total = int(np.prod(sizes, dtype=float))
+    if total > max_candidates:
+        raise ValueError(f"候選數過多 ({total})，請加大 increment 或縮小 max_change")
+    result = {"bets": family_bets, "target": [low, high], "candidates_evaluated": total, "feasible": 0, "best": [],
+              # 沒有任何候選值能讓RTP落在範圍內的參數
+              "unreachable": [_parameter_label(name) for name, grid in zip(names, grids) if len(grid) == 0]}
+    if total == 0:
+        return result
+
+    # 候選依混合進位的編號分批展開為矩陣 (候選 x 參數)，與機率矩陣相乘一次算出整批候選的RTP
+    strides = np.cumprod([1] + sizes[:0:-1])[::-1]
+    kept_candidates, kept_rtp, kept_distance = [], [], []
+    for start in range(0, total, CANDIDATE_CHUNK_SIZE):
+        index = np.arange(start, min(start + CANDIDATE_CHUNK_SIZE, total))
+        candidates = np.column_stack([grid[(index // stride) % size]
+                                      for grid, stride, size in zip(grids, strides, sizes)])
+        rtp = base + candidates @ coefficient.T
+        feasible = np.all((rtp >= low - 1e-12) & (rtp <= high + 1e-12), axis=1)
+        if monotone:
+            feasible &= _monotone_mask(candidates, parameters, family_bets, win_probability)
+        result["feasible"] += int(feasible.sum())
+        candidates, rtp = candidates[feasible], rtp[feasible]
+        distance = np.sqrt((((candidates - current) / current) ** 2).sum(axis=1))
+        # 每批只保留最接近的 top_k 個
+        best = np.argsort(distance, kind="stable")[:top_k]
+        kept_candidates.append(candidates[best])
+        kept_rtp.append(rtp[best])
+        kept_distance.append(distance[best])
+
+    candidates = np.concatenate(kept_candidates)
+    rtp = np.concatenate(kept_rtp)
+    distance = np.concatenate(kept_distance)
+    for index in np.argsort(distance, kind="stable")[:top_k]:
+        result["best"].append({
+            "payouts": {_parameter_label(name): float(value) for name, value in zip(names, candidates[index])},
+            "rtp": {bet_type: float(value) for bet_type, value in zip(family_bets, rtp[index])},
+            "distance": float(distance[index]),
+        })
+    return result
+
+
+def _monotone_mask(candidates, parameters, family_bets, win_probability):
+    """單調限制: 勝率較低的固定賠率押注賠率不得較低，單骰點數的賠率隨出現次數不遞減"""
+    mask = np.ones(len(candidates), dtype=bool)
+    scalar = [(win_probability[family_bets.index(bet_type)], column)
+              for column, ((bet_type, key), _, _) in enumerate(parameters) if key is None]
+    ordered = [column for _, column in sorted(scalar, key=lambda item: -item[0])]
+    for previous, following in zip(ordered, ordered[1:]):
+        mask &= candidates[:, following] >= candidates[:, previous] - 1e-12
+    for bet_type in family_bets:
+        counts = sorted((key, column) for column, ((name, key), _, _) in enumerate(parameters)
+                        if name == bet_type and isinstance(key, int))
+        for (_, previous), (_, following) in zip(counts, counts[1:]):
+            mask &= candidates[:, following] >= candidates[:, previous] - 1e-12
+    return mask
+
+
+def _parameter_label(name):
+    bet_type, key = name
+    return bet_type if key is None else f"{bet_type}[{key}]"
+
+
+def _apply_payouts(paytable, payouts):
+    """把候選的參數值套用到賠率表 (paytable 的每個項目已複製)"""
+    for label, value in payouts.items():
+        bet_type, _, key = label.partition("[")
+        key = key.rstrip("]")
+        payout = paytable[bet_type]["payout"]
+        if not key:
+            paytable[bet_type]["payout"] = value
+        elif key == "scale":
+            paytable[bet_type]["payout"] = _scale(payout, value)
+        else:
+            paytable[bet_type]["payout"] = {**payout, int(key): value}
+
+
+def _scale(payout, factor):
+    """把隨機倍數清單 (或單骰點數中各出現次數的清單) 乘上縮放比例"""
+    if isinstance(payout, dict):
+        return {count: _scale(count_payout, factor) if isinstance(count_payout, (list, tuple)) else count_payout
+                for count, count_payout in payout.items()}
+    return [round(m * factor, 10) for m in payout]
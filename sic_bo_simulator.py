@@ -4,11 +4,824 @@
 這個程式模擬骰寶遊戲，一次投擲三個骰子，並計算各種押注類型的獲勝機率和期望值。
 """
 
+import bisect
+import functools
+import hashlib
 import random
+import re
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+# 雙骰組合的所有點數配對，順序與 calculate_statistics 相同
+PAIR_COMBOS = [(i, j) for i in range(1, 7) for j in range(i + 1, 7)]
+
+
+def compute_batch_features(dice):
+    """以整個陣列運算計算一批投擲結果的各項判斷
+
+    dice: (N, 3) 的骰子點數陣列
+    返回各欄位皆為長度 N (或 N x 6 / N x 15) 的陣列
+    """
+    dice = np.asarray(dice)
+    total = dice.sum(axis=1, dtype=np.int16)
+    # counts[:, k] 為點數 k+1 出現的次數
+    counts = (dice[:, :, None] == np.arange(1, 7, dtype=dice.dtype)).sum(axis=1, dtype=np.uint8)
+    present = counts > 0
+    is_lo_or_less = total <= 10
+    is_hi_or_more = total >= 12
+    pair_i = np.array([i - 1 for i, _ in PAIR_COMBOS])
+    pair_j = np.array([j - 1 for _, j in PAIR_COMBOS])
+    return {
+        "total": total,
+        "is_triple": (dice[:, 0] == dice[:, 1]) & (dice[:, 1] == dice[:, 2]),
+        "is_hi": is_hi_or_more & (total <= 18),
+        "is_lo": is_lo_or_less & (total >= 3),
+        "is_hi_lo_11": total == 11,
+        "counts": counts,
+        # 三骰組合命中的點數個數: (1,2,3) 與 (4,5,6)
+        "low_match": present[:, 0:3].sum(axis=1),
+        "high_match": present[:, 3:6].sum(axis=1),
+        "x_lo": present & is_lo_or_less[:, None],
+        "x_hi": present & is_hi_or_more[:, None],
+        "pairs": present[:, pair_i] & present[:, pair_j],
+    }
+
+
+def _weighted_sum(flags, weights):
+    """沿第一個維度加總 (可帶權重)"""
+    if weights is None:
+        return flags.sum(axis=0)
+    return weights @ flags
+
+
+def statistics_from_features(features, weights=None):
+    """由批次特徵計算與 calculate_statistics 相同格式的統計資訊
+
+    weights: 每一列的出現次數，None 代表每列各出現一次
+    """
+    if weights is None:
+        total_rolls = len(features["total"])
+    else:
+        total_rolls = int(weights.sum())
+    if total_rolls == 0:
+        return "沒有模擬數據"
+
+    def freq(flags):
+        return float(_weighted_sum(flags, weights)) / total_rolls
+
+    stats = {
+        "總模擬次數": total_rolls,
+        "高 (HI)": freq(features["is_hi"]),
+        "低 (LO)": freq(features["is_lo"]),
+        "11 HI-LO": freq(features["is_hi_lo_11"]),
+        "三同點": freq(features["is_triple"]),
+        "點數總和": defaultdict(int),
+        "點數出現次數": {i: defaultdict(int) for i in range(1, 7)},
+        "三骰組合_低": {
+            "出現兩個": freq(features["low_match"] == 2),
+            "全中": freq(features["low_match"] == 3)
+        },
+        "三骰組合_高": {
+            "出現兩個": freq(features["high_match"] == 2),
+            "全中": freq(features["high_match"] == 3)
+        },
+    }
+    x_lo = _weighted_sum(features["x_lo"], weights)
+    x_hi = _weighted_sum(features["x_hi"], weights)
+    stats["X_LO"] = {x: float(x_lo[x - 1]) / total_rolls for x in range(1, 7)}
+    stats["X_HI"] = {x: float(x_hi[x - 1]) / total_rolls for x in range(1, 7)}
+
+    # 只記錄實際出現過的總點數與出現次數，與逐局統計的 defaultdict 一致
+    total_counts = np.bincount(features["total"], weights=weights, minlength=19)
+    for total in range(3, 19):
+        if total_counts[total] > 0:
+            stats["點數總和"][total] = float(total_counts[total]) / total_rolls
+    for count in range(1, 4):
+        face_counts = _weighted_sum(features["counts"] == count, weights)
+        for num in range(1, 7):
+            if face_counts[num - 1] > 0:
+                stats["點數出現次數"][num][count] = float(face_counts[num - 1]) / total_rolls
+
+    pairs = _weighted_sum(features["pairs"], weights)
+    stats["雙骰組合"] = {
+        f"{i},{j}": float(pairs[k]) / total_rolls for k, (i, j) in enumerate(PAIR_COMBOS)
+    }
+    return stats
+
+
+@functools.lru_cache(maxsize=None)
+def outcome_dice():
+    """三顆骰子全部 216 種等機率結果，返回 (216, 3) 的 uint8 陣列
+
+    第 k 列的編碼為 k = (d1-1)*36 + (d2-1)*6 + (d3-1)
+    """
+    dice = (np.indices((6, 6, 6)).reshape(3, -1).T + 1).astype(np.uint8)
+    dice.flags.writeable = False
+    return dice
+
+
+@functools.lru_cache(maxsize=None)
+def outcome_features():
+    """216 種結果的批次特徵 (整個行程只計算一次)"""
+    return compute_batch_features(outcome_dice())
+
+
+def encode_dice(dice):
+    """把骰子點數編碼為 0-215 的結果代碼
+
+    可傳入單局 [d1, d2, d3] (返回 int) 或 (N, 3) 陣列 (返回 uint8 陣列)
+    """
+    if isinstance(dice, (list, tuple)):
+        return (dice[0] - 1) * 36 + (dice[1] - 1) * 6 + (dice[2] - 1)
+    dice = np.asarray(dice).astype(np.uint8, copy=False)
+    return (dice[..., 0] - 1) * 36 + (dice[..., 1] - 1) * 6 + (dice[..., 2] - 1)
+
+
+class RollAccumulator:
+    """投擲結果累計器
+
+    只記錄 216 種結果各出現幾次，所有統計資訊都由這個次數表推導，
+    因此加入新結果為 O(1)，讀取統計為 O(216)，並可與其他累計器合併。
+    """
 
-class SicBoSimulator:
     def __init__(self):
+        self.outcome_counts = np.zeros(216, dtype=np.int64)
+        # 每次加入新結果時遞增，用來判斷快取是否過期
+        self.version = 0
+        self._stats_cache = None
+
+    @property
+    def total_rolls(self):
+        return int(self.outcome_counts.sum())
+
+    def add_roll(self, dice):
+        """加入單局骰子點數"""
+        self.outcome_counts[encode_dice(dice)] += 1
+        self.version += 1
+
+    def add_codes(self, codes):
+        """加入一批結果代碼"""
+        self.outcome_counts += np.bincount(codes, minlength=216)
+        self.version += 1
+
+    def add_dice(self, dice):
+        """加入 (N, 3) 的骰子陣列"""
+        self.add_codes(encode_dice(dice))
+
+    def clear(self):
+        """清除所有結果 (版本號繼續遞增，依版本的快取不會誤用舊結果)"""
+        self.outcome_counts[:] = 0
+        self.version += 1
+
+    def merge(self, other):
+        """合併另一個累計器的結果"""
+        self.outcome_counts += other.outcome_counts
+        self.version += 1
+        return self
+
+    def statistics(self):
+        """返回與 calculate_statistics 相同格式的統計資訊，在加入新結果前會重複使用"""
+        if self._stats_cache is None or self._stats_cache[0] != self.version:
+            stats = statistics_from_features(outcome_features(), self.outcome_counts)
+            self._stats_cache = (self.version, stats)
+        return self._stats_cache[1]
+
+
+# 平行模擬時每個區塊的投擲次數
+ROLL_BLOCK_SIZE = 1_000_000
+
+
+def resolve_seed(seed=None):
+    """未指定種子時產生一個，讓分片後的所有串流共用同一個種子"""
+    if seed is None:
+        return np.random.SeedSequence().entropy
+    return seed
+
+
+class DiceStream:
+    """計數器式 (Philox) 骰子串流
+
+    第 game 局 (從 0 起算) 的結果只由 (seed, player, game) 決定，
+    可以直接產生任一局或任一段，不需要重播之前的局數。
+    lane 用來區分同一位玩家的其他亂數用途 (0 為骰子)。
+    """
+
+    # 逐局讀取時每次預先產生的局數
+    BUFFER_SIZE = 1024
+
+    def __init__(self, seed=None, player=0, lane=0):
+        self.seed = resolve_seed(seed)
+        self.player = player
+        self.lane = lane
+        self._key = np.random.SeedSequence(self.seed, spawn_key=(player, lane)).generate_state(2, np.uint64)
+        # 逐局讀取 (next_dice) 的下一局位置
+        self.position = 0
+        self._buffer = []
+        self._buffer_start = 0
+
+    def for_player(self, player):
+        """同一個種子下另一位玩家的串流"""
+        return DiceStream(self.seed, player, self.lane)
+
+    def raw(self, start, stop):
+        """第 start 到 stop-1 局的 64 位元亂數"""
+        # Philox 每個計數器產生 4 個 64 位元亂數，直接把計數器設到起點所在的區塊
+        block = start // 4
+        generator = np.random.Philox(key=self._key, counter=np.array([block, 0, 0, 0], dtype=np.uint64))
+        return generator.random_raw(stop - block * 4)[start - block * 4:]
+
+    def codes(self, start, stop):
+        """第 start 到 stop-1 局的結果代碼 (0-215)"""
+        raw = self.raw(start, stop)
+        # 計算 floor(raw * 216 / 2^64)，拆成高低 32 位元避免溢位
+        high = raw >> np.uint64(32)
+        low = raw & np.uint64(0xFFFFFFFF)
+        codes = (high * np.uint64(216) + ((low * np.uint64(216)) >> np.uint64(32))) >> np.uint64(32)
+        return codes.astype(np.uint8)
+
+    def uniforms(self, start, stop):
+        """第 start 到 stop-1 局的 [0, 1) 均勻亂數"""
+        return (self.raw(start, stop) >> np.uint64(11)) * (1.0 / (1 << 53))
+
+    def dice(self, start, stop):
+        """第 start 到 stop-1 局的 (N, 3) 骰子陣列"""
+        return outcome_dice()[self.codes(start, stop)]
+
+    def roll(self, game):
+        """直接產生第 game 局的骰子點數"""
+        return [int(d) for d in outcome_dice()[self.codes(game, game + 1)[0]]]
+
+    def next_dice(self):
+        """逐局讀取下一局的骰子點數"""
+        offset = self.position - self._buffer_start
+        if not 0 <= offset < len(self._buffer):
+            self._buffer = self.dice(self.position, self.position + self.BUFFER_SIZE).tolist()
+            self._buffer_start = self.position
+            offset = 0
+        self.position += 1
+        return self._buffer[offset]
+
+    def next_dice_batch(self, num_rolls):
+        """逐段讀取接下來 num_rolls 局的骰子陣列"""
+        dice = self.dice(self.position, self.position + num_rolls)
+        self.position += num_rolls
+        return dice
+
+
+def _roll_blocks(seed, blocks, num_simulations, block_size):
+    """在工作程序中模擬指定的區塊，返回 216 種結果的出現次數
+
+    第 block 個區塊為 DiceStream(seed) 的第 block * block_size 局起的一段。
+    """
+    stream = DiceStream(seed)
+    counts = np.zeros(216, dtype=np.int64)
+    for block in blocks:
+        start = block * block_size
+        stop = min(start + block_size, num_simulations)
+        counts += np.bincount(stream.codes(start, stop), minlength=216)
+    return counts
+
+
+# 三骰組合命中點數個數對應的結果文字
+_COMBO_LABELS = {3: "全中", 2: "出現兩個"}
+
+
+@functools.lru_cache(maxsize=None)
+def _outcome_result(code):
+    """結果代碼對應的完整結果，欄位與 simulate_single_roll 相同"""
+    features = outcome_features()
+    total = int(features["total"][code])
+    return {
+        "dice": [int(d) for d in outcome_dice()[code]],
+        "total": total,
+        "is_triple": bool(features["is_triple"][code]),
+        "is_hi": bool(features["is_hi"][code]),
+        "is_lo": bool(features["is_lo"][code]),
+        "is_hi_lo_11": bool(features["is_hi_lo_11"][code]),
+        "counts": {i: int(features["counts"][code, i - 1]) for i in range(1, 7)},
+        "low_combo": _COMBO_LABELS.get(int(features["low_match"][code]), "不符合"),
+        "high_combo": _COMBO_LABELS.get(int(features["high_match"][code]), "不符合"),
+        "x_lo": {x: bool(features["x_lo"][code, x - 1]) for x in range(1, 7)},
+        "x_hi": {x: bool(features["x_hi"][code, x - 1]) for x in range(1, 7)},
+    }
+
+
+class RollView:
+    """壓縮歷史中單局結果的輕量檢視
+
+    只保存結果代碼，result["dice"] 等欄位在讀取時才還原。
+    """
+
+    __slots__ = ("code",)
+
+    def __init__(self, code):
+        self.code = int(code)
+
+    def __getitem__(self, key):
+        value = _outcome_result(self.code)[key]
+        # 返回副本，避免呼叫端修改到共用的快取
+        if isinstance(value, (list, dict)):
+            return value.copy()
+        return value
+
+    def __contains__(self, key):
+        return key in _outcome_result(self.code)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return _outcome_result(self.code).keys()
+
+    def to_dict(self):
+        """還原為與 simulate_single_roll 相同的結果字典"""
+        return {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, RollView):
+            return self.code == other.code
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __repr__(self):
+        return f"RollView(dice={self['dice']})"
+
+
+class CompactRollHistory:
+    """壓縮的投擲歷史: 每局只存一個 uint8 結果代碼 (0-215)
+
+    容量不足時倍增，讀取時返回 RollView。
+    """
+
+    def __init__(self, capacity=1024):
+        self._codes = np.empty(max(capacity, 1), dtype=np.uint8)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        if needed > len(self._codes):
+            capacity = len(self._codes)
+            while capacity < needed:
+                capacity *= 2
+            codes = np.empty(capacity, dtype=np.uint8)
+            codes[:self._size] = self._codes[:self._size]
+            self._codes = codes
+
+    @property
+    def codes(self):
+        """目前所有結果代碼 (唯讀檢視)"""
+        view = self._codes[:self._size]
+        view.flags.writeable = False
+        return view
+
+    def append(self, result):
+        """加入一局結果，可傳入 RollView、結果字典或結果代碼"""
+        if isinstance(result, RollView):
+            code = result.code
+        elif isinstance(result, dict):
+            code = encode_dice(result["dice"])
+        else:
+            code = int(result)
+        self._reserve(1)
+        self._codes[self._size] = code
+        self._size += 1
+
+    def extend_codes(self, codes):
+        """加入一批結果代碼"""
+        codes = np.asarray(codes, dtype=np.uint8)
+        self._reserve(len(codes))
+        self._codes[self._size:self._size + len(codes)] = codes
+        self._size += len(codes)
+
+    def clear(self):
+        """清空歷史並釋放緩衝區 (與 list.clear 相同，不影響模擬器的 accumulator)"""
+        self._codes = np.empty(1024, dtype=np.uint8)
+        self._size = 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [RollView(code) for code in self._codes[:self._size][index]]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("history index out of range")
+        return RollView(self._codes[index])
+
+    def __iter__(self):
+        for code in self._codes[:self._size].tolist():
+            yield RollView(code)
+
+
+def bet_category(bet_type):
+    """解析押注類型名稱，返回 (類別, 指定點數X)"""
+    if bet_type == "高 (HI)":
+        return "hi", None
+    if bet_type == "低 (LO)":
+        return "lo", None
+    if bet_type == "11 HI-LO":
+        return "hi_lo_11", None
+    if bet_type.startswith("單骰點數"):
+        return "single", None
+    if bet_type.startswith("雙骰組合"):
+        return "pair", None
+    if bet_type.startswith("三骰組合_出現兩個"):
+        return "combo_two", None
+    if bet_type.startswith("三骰組合_全中"):
+        return "combo_all", None
+    match = re.match(r"^([1-6])_(LO|HI)", bet_type)
+    if match:
+        return f"x_{match.group(2).lower()}", int(match.group(1))
+    raise ValueError(f"未知的押注類型: {bet_type}")
+
+
+def bet_selections(bet_type):
+    """押注類型可指定的選項: 單骰點數為點數、雙骰組合為 "i,j"、三骰組合為 'low'/'high'"""
+    category, _ = bet_category(bet_type)
+    if category == "single":
+        return list(range(1, 7))
+    if category == "pair":
+        return [f"{i},{j}" for i, j in PAIR_COMBOS]
+    if category in ("combo_two", "combo_all"):
+        return ["low", "high"]
+    return [None]
+
+
+def parse_selection(bet_type, selection=None):
+    """把外部傳入的選項 (例如 "3"、"2,1"、"低") 轉為 bet_selections 中的格式"""
+    category, _ = bet_category(bet_type)
+    if category == "single":
+        try:
+            selection = int(selection)
+        except (TypeError, ValueError):
+            raise ValueError(f"{bet_type} 需要指定點數 1-6")
+    elif category == "pair":
+        try:
+            i, j = sorted(int(n) for n in str(selection).split(","))
+        except (TypeError, ValueError):
+            raise ValueError(f"{bet_type} 需要指定兩個點數，例如 \"1,2\"")
+        selection = f"{i},{j}"
+    elif category in ("combo_two", "combo_all"):
+        selection = {"低": "low", "高": "high"}.get(selection, selection)
+    else:
+        selection = None
+    if selection not in bet_selections(bet_type):
+        raise ValueError(f"{bet_type} 不支援選項 {selection}")
+    return selection
+
+
+def bet_hits(bet_type, selection=None, features=None):
+    """計算每種結果的命中情況
+
+    單骰點數返回指定點數出現的次數 (0-3)，其他押注返回 0/1
+    features 預設為 216 種結果的特徵
+    """
+    if features is None:
+        features = outcome_features()
+    category, x = bet_category(bet_type)
+    if category == "single":
+        return features["counts"][:, selection - 1].astype(np.int8)
+    if category == "pair":
+        i, j = (int(n) for n in str(selection).split(","))
+        hits = features["pairs"][:, PAIR_COMBOS.index((min(i, j), max(i, j)))]
+    elif category in ("combo_two", "combo_all"):
+        match = features["low_match" if selection == "low" else "high_match"]
+        hits = match == (2 if category == "combo_two" else 3)
+    elif category in ("x_lo", "x_hi"):
+        hits = features[category][:, x - 1]
+    else:
+        hits = features[f"is_{category}"]
+    return hits.astype(np.int8)
+
+
+def multiplier_probabilities(payout, weights=None):
+    """隨機倍數清單中每個倍數的機率
+
+    weights 為與倍數清單等長的非負權重 (不需加總為 1)，未指定時視為均勻分佈
+    """
+    values = np.asarray(payout, dtype=float).reshape(-1)
+    if weights is None:
+        return np.full(len(values), 1 / len(values))
+    weights = np.asarray(weights, dtype=float).reshape(-1)
+    if len(weights) != len(values) or np.any(weights < 0) or weights.sum() <= 0:
+        raise ValueError(f"倍數權重 {weights.tolist()} 與倍數清單 {values.tolist()} 不相符")
+    return weights / weights.sum()
+
+
+def multiplier_moments(payout, weights=None):
+    """賠率 (固定值或隨機倍數清單) 下，每單位押注回收 (1 + 賠率) 的一階與二階動差
+
+    隨機倍數清單未指定權重時視為均勻分佈
+    """
+    returns = 1 + np.asarray(payout, dtype=float).reshape(-1)
+    if weights is None:
+        return float(returns.mean()), float((returns ** 2).mean())
+    probabilities = multiplier_probabilities(payout, weights)
+    return float(probabilities @ returns), float(probabilities @ returns ** 2)
+
+
+def _count_weights(weights, count):
+    """取得單骰點數某個出現次數的權重 (權重設定可為清單或依出現次數的字典)"""
+    if isinstance(weights, dict):
+        return weights.get(count)
+    return weights
+
+
+def bet_return_moments(bet_type, payout, selection=None, features=None, weights=None):
+    """每種結果下每單位押注的期望回收與回收平方的期望，返回兩個陣列"""
+    hits = bet_hits(bet_type, selection, features)
+    first = np.zeros(len(hits))
+    second = np.zeros(len(hits))
+    if isinstance(payout, dict):
+        # 單骰點數: 依出現次數決定賠率
+        for count, count_payout in payout.items():
+            mean, square = multiplier_moments(count_payout, _count_weights(weights, count))
+            first[hits == count] = mean
+            second[hits == count] = square
+    else:
+        mean, square = multiplier_moments(payout, weights)
+        first[hits > 0] = mean
+        second[hits > 0] = square
+    return first, second
+
+
+def _freeze(value):
+    """把賠率設定轉為可雜湊的結構，作為快取鍵"""
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def paytable_key(bet_types):
+    """賠率表的快取鍵 (忽略說明文字)，隨機倍數有指定權重時一併納入"""
+    return tuple(
+        (name, _freeze(info["payout"])) if info.get("weights") is None
+        else (name, _freeze(info["payout"]), _freeze(info["weights"]))
+        for name, info in bet_types.items()
+    )
+
+
+class SettlementTable:
+    """結果代碼 x 押注編號的結算表，每個賠率表只建立一次
+
+    bets[bet_id] 為 (押注類型, 指定選項)；
+    table[code, bet_id] 為該結果下每單位押注的回收倍數 (含本金，輸則為 0)，
+    隨機倍數押注存放平均回收倍數；table_sq 為回收倍數平方的期望，用於計算變異數；
+    hits[code, bet_id] 為命中情況 (單骰點數為出現次數)。
+    隨機倍數押注的可能回收倍數記錄在 choices[bet_id][命中情況]，
+    對應的機率在 choice_probabilities[bet_id][命中情況] (由賠率表的 "weights" 決定，預設均勻)，由 settle 抽樣。
+    """
+
+    def __init__(self, bet_types):
+        self.bets = [
+            (bet_type, selection)
+            for bet_type in bet_types
+            for selection in bet_selections(bet_type)
+        ]
+        self.bet_index = {bet: bet_id for bet_id, bet in enumerate(self.bets)}
+        self.table = np.zeros((216, len(self.bets)))
+        self.table_sq = np.zeros((216, len(self.bets)))
+        self.hits = np.zeros((216, len(self.bets)), dtype=np.int8)
+        self.choices = {}
+        self.choice_probabilities = {}
+        # 有指定權重的押注: 每種命中情況的累積機率，settle 以 searchsorted 抽樣
+        self._choice_cdf = {}
+        for bet_id, (bet_type, selection) in enumerate(self.bets):
+            payout = bet_types[bet_type]["payout"]
+            weights = bet_types[bet_type].get("weights")
+            self.hits[:, bet_id] = bet_hits(bet_type, selection)
+            self.table[:, bet_id], self.table_sq[:, bet_id] = bet_return_moments(
+                bet_type, payout, selection, weights=weights)
+            by_count = payout if isinstance(payout, dict) else {1: payout}
+            if any(isinstance(count_payout, (list, tuple)) for count_payout in by_count.values()):
+                self.choices[bet_id] = {
+                    count: 1 + np.asarray(count_payout, dtype=float).reshape(-1)
+                    for count, count_payout in by_count.items()
+                }
+                count_weights = {count: _count_weights(weights, count) if isinstance(payout, dict) else weights
+                                 for count in by_count}
+                self.choice_probabilities[bet_id] = {
+                    count: multiplier_probabilities(count_payout, count_weights[count])
+                    for count, count_payout in by_count.items()
+                }
+                if weights is not None:
+                    self._choice_cdf[bet_id] = {
+                        count: np.cumsum(probabilities)
+                        for count, probabilities in self.choice_probabilities[bet_id].items()
+                    }
+        for array in (self.table, self.table_sq, self.hits):
+            array.flags.writeable = False
+
+    def bet_id(self, bet_type, selection=None):
+        """押注類型與選項對應的押注編號"""
+        try:
+            return self.bet_index[(bet_type, selection)]
+        except KeyError:
+            raise ValueError(f"未知的押注: {bet_type} {selection if selection is not None else ''}".strip())
+
+    def is_random(self, bet_id):
+        """是否為隨機倍數押注"""
+        return bet_id in self.choices
+
+    def return_distribution(self, bet_id):
+        """每單位押注回收倍數的精確分佈，返回 (回收倍數, 機率) 兩個陣列 (回收倍數遞增)"""
+        probabilities = defaultdict(float)
+        for code in range(216):
+            count = int(self.hits[code, bet_id])
+            values = self.choices.get(bet_id, {}).get(count)
+            if values is None:
+                probabilities[float(self.table[code, bet_id])] += 1 / 216
+            else:
+                for value, probability in zip(values, self.choice_probabilities[bet_id][count]):
+                    probabilities[float(value)] += probability / 216
+        returns = np.array(sorted(probabilities))
+        return returns, np.array([probabilities[value] for value in returns])
+
+    def settle(self, codes, bet_id, uniforms=None):
+        """結算單局或一批結果代碼，返回每單位押注的回收倍數
+
+        隨機倍數押注以 uniforms (與 codes 同形狀的 [0, 1) 均勻亂數) 抽出實際倍數
+        (未指定權重時為 floor(u x 倍數個數)，有權重時依累積機率)；
+        未傳入 uniforms 時返回平均回收倍數。
+        """
+        if uniforms is None or bet_id not in self.choices:
+            return self.table[codes, bet_id]
+        codes = np.asarray(codes)
+        uniforms = np.broadcast_to(uniforms, codes.shape)
+        hits = self.hits[codes, bet_id]
+        returns = np.zeros(codes.shape)
+        for count, values in self.choices[bet_id].items():
+            mask = hits == count
+            if bet_id in self._choice_cdf:
+                index = np.searchsorted(self._choice_cdf[bet_id][count], uniforms[mask], side="right")
+            else:
+                index = (uniforms[mask] * len(values)).astype(np.int64)
+            returns[mask] = values[np.minimum(index, len(values) - 1)]
+        return returns
+
+    def scalar_settler(self, bet_id):
+        """逐局結算用的純 Python 函式 settle(code, uniform) -> 回收倍數，結果與 settle 相同
+
+        每局只做串列查詢 (有權重時另做一次 bisect)，避免逐局呼叫 NumPy 的開銷。
+        """
+        returns = self.table[:, bet_id].tolist()
+        if bet_id not in self.choices:
+            return lambda code, uniform=None: returns[code]
+        hits = self.hits[:, bet_id].tolist()
+        choices = {count: values.tolist() for count, values in self.choices[bet_id].items()}
+        cdf = {count: values.tolist() for count, values in self._choice_cdf.get(bet_id, {}).items()}
+
+        def settle(code, uniform):
+            count = hits[code]
+            values = choices.get(count)
+            if values is None:
+                return returns[code]
+            if cdf:
+                index = bisect.bisect_right(cdf[count], uniform)
+            else:
+                index = int(uniform * len(values))
+            return values[min(index, len(values) - 1)]
+        return settle
+
+    def sample(self, codes, bet_id, rng=None):
+        """以 rng (numpy Generator，未指定時新建) 抽樣結算一批結果代碼的回收倍數"""
+        codes = np.asarray(codes)
+        if bet_id not in self.choices:
+            return self.table[codes, bet_id]
+        rng = rng if rng is not None else np.random.default_rng()
+        return self.settle(codes, bet_id, rng.random(codes.shape))
+
+
+# 依賠率表快取的結算表與精確分析最多保留的賠率表數 (自訂賠率表不會讓快取無限增長)
+PAYTABLE_CACHE_SIZE = 32
+
+
+@functools.lru_cache(maxsize=PAYTABLE_CACHE_SIZE)
+def _settlement_table(key):
+    return SettlementTable({
+        name: {"payout": _thaw_payout(payout), "weights": _thaw_payout(weights[0]) if weights else None}
+        for name, payout, *weights in key
+    })
+
+
+def settlement_table(bet_types):
+    """取得賠率表對應的結算表 (依賠率表快取)"""
+    return _settlement_table(paytable_key(bet_types))
+
+
+def paytable_version(bet_types):
+    """賠率表版本: 賠率內容的雜湊，任何賠率改變時版本也會改變"""
+    return hashlib.sha1(repr(paytable_key(bet_types)).encode("utf-8")).hexdigest()[:12]
+
+
+@functools.lru_cache(maxsize=PAYTABLE_CACHE_SIZE)
+def _exact_bet_analysis(key):
+    """以 216 種結果精確計算每個押注的勝率、期望值、莊家優勢與變異數"""
+    table = _settlement_table(key)
+    win_probability = (table.hits > 0).mean(axis=0)
+    expected_value = table.table.mean(axis=0)
+    variance = table.table_sq.mean(axis=0) - expected_value ** 2
+    analysis = {}
+    for bet_id, (bet_type, selection) in enumerate(table.bets):
+        values = {
+            "win_probability": float(win_probability[bet_id]),
+            "expected_value": float(expected_value[bet_id]),
+            "house_edge": 1 - float(expected_value[bet_id]),
+            "variance": float(variance[bet_id]),
+        }
+        if selection is None:
+            analysis[bet_type] = values
+        else:
+            analysis.setdefault(bet_type, {})[selection] = values
+    return analysis
+
+
+def _thaw_payout(frozen):
+    """把 _freeze 後的賠率還原為原本的數值/清單/字典"""
+    if isinstance(frozen, tuple) and frozen and isinstance(frozen[0], tuple):
+        return {k: _thaw_payout(v) for k, v in frozen}
+    if isinstance(frozen, tuple):
+        return list(frozen)
+    return frozen
+
+
+class RunningStats:
+    """以批次累計多個指標的平均值與共變異 (Chan 等人的合併公式)
+
+    每次加入 (N,) 或 (N, 指標數) 的數值，只保留次數、平均值與離均差乘積和，
+    可與其他累計器合併，適合邊模擬邊判斷精確度。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.comoment = None
+
+    def add(self, values):
+        """加入一批數值"""
+        values = np.asarray(values, dtype=float)
+        values = values.reshape(len(values), -1)
+        if len(values) == 0:
+            return self
+        mean = values.mean(axis=0)
+        centered = values - mean
+        return self._merge(len(values), mean, centered.T @ centered)
+
+    def merge(self, other):
+        """合併另一個累計器"""
+        if other.count:
+            self._merge(other.count, other.mean, other.comoment)
+        return self
+
+    def _merge(self, count, mean, comoment):
+        if not self.count:
+            self.count, self.mean, self.comoment = count, mean.copy(), comoment.copy()
+            return self
+        total = self.count + count
+        delta = mean - self.mean
+        self.comoment = self.comoment + comoment + np.outer(delta, delta) * self.count * count / total
+        self.mean = self.mean + delta * count / total
+        self.count = total
+        return self
+
+    @property
+    def covariance(self):
+        """樣本共變異矩陣"""
+        return self.comoment / max(self.count - 1, 1)
+
+    @property
+    def variance(self):
+        return np.diag(self.covariance)
+
+    @property
+    def std_error(self):
+        """平均值的標準誤"""
+        return np.sqrt(self.variance / max(self.count, 1))
+
+    def half_width(self, confidence=0.95):
+        """平均值信賴區間的半寬"""
+        return confidence_z(confidence) * self.std_error
+
+
+def confidence_z(confidence=0.95):
+    """雙尾常態信賴區間對應的 z 值"""
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+class SicBoSimulator:
+    def __init__(self, compact_history=False, rng=None):
+        """compact_history: 以 CompactRollHistory 儲存歷史，每局只佔 1 byte
+        rng: DiceStream 或 numpy.random.Generator，未指定時使用 random 模組
+        """
         # 定義各種押注類型和賠率
         self.bet_types = {
             # 基本高低注區
@@ -78,11 +891,48 @@ class SicBoSimulator:
             "三骰組合_出現兩個_隨機高倍": {"description": "三顆骰子組合中出現兩個點數 (隨機高倍)", "payout": [1, 2, 3, 5, 8]},
             "三骰組合_全中_隨機高倍": {"description": "三顆骰子組合中，三個點數全中 (隨機高倍)", "payout": [5, 10, 15, 25, 40]},
         }
-        self.results_history = []
+        self.compact_history = compact_history
+        self.rng = rng
+        self.results_history = CompactRollHistory() if compact_history else []
+        # 逐局累計的統計，calculate_statistics 與 calculate_expected_value 直接讀取
+        self.accumulator = RollAccumulator()
+        self._ev_cache = None
+        # 累計器對應的歷史物件與長度，用來偵測 results_history 被清空或替換
+        self._history_state = (self.results_history, 0)
+
+    def reset(self):
+        """清除投擲歷史與累計統計"""
+        self.results_history = CompactRollHistory() if self.compact_history else []
+        self.accumulator.clear()
+        self._history_state = (self.results_history, 0)
+
+    def _sync_history(self):
+        """results_history 被清空 (clear) 或替換時，以目前的歷史重建累計器
+
+        批次模式 (未使用壓縮歷史) 的投擲不在歷史中，清空歷史後也會一併清除，
+        讓 calculate_statistics 與 results_history 一致。
+        """
+        history, size = self._history_state
+        if self.results_history is not history or len(self.results_history) < size:
+            self.accumulator.clear()
+            if isinstance(self.results_history, CompactRollHistory):
+                self.accumulator.add_codes(self.results_history.codes)
+            elif self.results_history:
+                self.accumulator.add_dice(np.array([result["dice"] for result in self.results_history]))
+        self._history_state = (self.results_history, len(self.results_history))
+
+    @property
+    def settlement_table(self):
+        """目前賠率表的結算表 (依賠率表快取)"""
+        return settlement_table(self.bet_types)
 
     def roll_dice(self):
         """模擬投擲三個骰子"""
-        return [random.randint(1, 6) for _ in range(3)]
+        if self.rng is None:
+            return [random.randint(1, 6) for _ in range(3)]
+        if isinstance(self.rng, DiceStream):
+            return self.rng.next_dice()
+        return self.rng.integers(1, 7, size=3).tolist()
 
     def get_total_points(self, dice):
         """計算骰子總點數"""
@@ -147,100 +997,185 @@ class SicBoSimulator:
     
     def simulate_single_roll(self):
         """模擬一次投擲並返回結果"""
+        self._sync_history()
         dice = self.roll_dice()
-        total = self.get_total_points(dice)
-        is_triple = self.is_triple(dice)
-        
-        # 計算各點數出現次數
-        counts = {i: dice.count(i) for i in range(1, 7)}
-        
-        # 計算各種三骰組合結果
-        low_combo_result = self.check_three_dice_combo(dice, 'low')
-        high_combo_result = self.check_three_dice_combo(dice, 'high')
-        
-        # 計算各種點數與高低組合結果
-        x_lo_results = {x: self.check_x_lo(dice, x) for x in range(1, 7)}
-        x_hi_results = {x: self.check_x_hi(dice, x) for x in range(1, 7)}
-        
+        code = encode_dice(dice)
+        self.accumulator.add_roll(dice)
+        if self.compact_history:
+            self.results_history.append(code)
+            return RollView(code)
+
+        # 各欄位由預先計算的結果表取得，只複製可變的欄位
         result = {
-            "dice": dice,
-            "total": total,
-            "is_triple": is_triple,
-            "is_hi": self.is_hi(dice),
-            "is_lo": self.is_lo(dice),
-            "is_hi_lo_11": self.is_hi_lo_11(dice),
-            "counts": counts,
-            "low_combo": low_combo_result,
-            "high_combo": high_combo_result,
-            "x_lo": x_lo_results,
-            "x_hi": x_hi_results
+            key: value.copy() if isinstance(value, dict) else value
+            for key, value in _outcome_result(code).items()
         }
-        
+        result["dice"] = dice
         self.results_history.append(result)
         return result
     
-    def simulate_multiple_rolls(self, num_simulations=1000):
-        """模擬多次投擲"""
-        for _ in range(num_simulations):
-            self.simulate_single_roll()
-        return self.results_history
+    def simulate_multiple_rolls(self, num_simulations=1000, chunk_size=None, spill_path=None, rng=None):
+        """模擬多次投擲
+
+        未指定 chunk_size 與 spill_path 時逐局模擬並記錄到 results_history，返回 results_history。
+        分段模式 (指定任一者): 每次產生 chunk_size 局 (預設 ROLL_BLOCK_SIZE)，併入 accumulator 後即丟棄，
+        不寫入 results_history，峰值記憶體只與 chunk_size 有關，與投擲次數無關；返回這次投擲的統計資訊。
+        spill_path: 把每局的結果代碼逐段寫入該目錄的封存 (記憶體映射檔，見 sic_bo_archive)，可用 open_archive 重新開啟。
+        rng: DiceStream 或 numpy.random.Generator，未指定時使用模擬器的 rng
+        """
+        if chunk_size is None and spill_path is None:
+            for _ in range(num_simulations):
+                self.simulate_single_roll()
+            return self.results_history
+
+        self._sync_history()
+        chunk_size = chunk_size or ROLL_BLOCK_SIZE
+        if rng is None:
+            rng = self.rng if self.rng is not None else np.random.default_rng()
+        writer = None
+        if spill_path is not None:
+            from sic_bo_archive import RollArchiveWriter
+            writer = RollArchiveWriter(spill_path, num_simulations, self.bet_types,
+                                       seed=rng.seed if isinstance(rng, DiceStream) else None,
+                                       params={"num_rolls": num_simulations, "chunk_size": chunk_size})
+        run = RollAccumulator()
+        for start in range(0, num_simulations, chunk_size):
+            codes = encode_dice(self.roll_dice_batch(min(chunk_size, num_simulations - start), rng))
+            run.add_codes(codes)
+            if writer is not None:
+                writer.append(codes)
+        if writer is not None:
+            writer.close()
+        self.accumulator.merge(run)
+        return run.statistics()
+
+    def roll_dice_batch(self, num_rolls, rng=None):
+        """一次投擲 num_rolls 局，返回 (N, 3) 的 uint8 骰子陣列
+
+        rng 未指定時使用模擬器的 rng，兩者皆未指定則使用新的預設產生器
+        """
+        if rng is None:
+            rng = self.rng if self.rng is not None else np.random.default_rng()
+        if isinstance(rng, DiceStream):
+            return rng.next_dice_batch(num_rolls)
+        return rng.integers(1, 7, size=(num_rolls, 3), dtype=np.uint8)
+
+    def simulate_batch_rolls(self, num_simulations=1000, rng=None):
+        """批次模式: 以 NumPy 陣列運算模擬多次投擲
+
+        結果會併入 accumulator；使用壓縮歷史時也會寫入 results_history，
+        否則不逐局記錄。返回這一批投擲與 calculate_statistics 相同格式的統計資訊。
+        rng: DiceStream 或 numpy.random.Generator，未指定時使用模擬器的 rng
+        """
+        self._sync_history()
+        codes = encode_dice(self.roll_dice_batch(num_simulations, rng))
+        if self.compact_history:
+            self.results_history.extend_codes(codes)
+        batch = RollAccumulator()
+        batch.add_codes(codes)
+        self.accumulator.merge(batch)
+        return batch.statistics()
     
-    def calculate_statistics(self):
-        """計算統計資訊"""
-        if not self.results_history:
-            return "沒有模擬數據"
-        
-        total_rolls = len(self.results_history)
-        stats = {
-            "總模擬次數": total_rolls,
-            "高 (HI)": sum(1 for r in self.results_history if r["is_hi"]) / total_rolls,
-            "低 (LO)": sum(1 for r in self.results_history if r["is_lo"]) / total_rolls,
-            "11 HI-LO": sum(1 for r in self.results_history if r["is_hi_lo_11"]) / total_rolls,
-            "三同點": sum(1 for r in self.results_history if r["is_triple"]) / total_rolls,
-            "點數總和": defaultdict(int),
-            "點數出現次數": {i: defaultdict(int) for i in range(1, 7)},
-            "三骰組合_低": {
-                "出現兩個": sum(1 for r in self.results_history if r["low_combo"] == "出現兩個") / total_rolls,
-                "全中": sum(1 for r in self.results_history if r["low_combo"] == "全中") / total_rolls
-            },
-            "三骰組合_高": {
-                "出現兩個": sum(1 for r in self.results_history if r["high_combo"] == "出現兩個") / total_rolls,
-                "全中": sum(1 for r in self.results_history if r["high_combo"] == "全中") / total_rolls
-            },
-            "X_LO": {x: sum(1 for r in self.results_history if r["x_lo"][x]) / total_rolls for x in range(1, 7)},
-            "X_HI": {x: sum(1 for r in self.results_history if r["x_hi"][x]) / total_rolls for x in range(1, 7)}
+    def simulate_batch_rolls_parallel(self, num_simulations=1000, seed=None, workers=None,
+                                      block_size=ROLL_BLOCK_SIZE):
+        """以多個工作程序平行執行批次模擬
+
+        投擲結果為 DiceStream(seed) 的前 num_simulations 局，切成區塊分給各工作程序，
+        因此同一個 seed 不論 workers 或 block_size 為多少都得到相同結果。
+        結果併入 accumulator (不寫入 results_history)，返回這一批投擲的統計資訊。
+        """
+        self._sync_history()
+        seed = resolve_seed(seed)
+        num_blocks = -(-num_simulations // block_size)
+        batch = RollAccumulator()
+        if workers is None or workers <= 1:
+            batch.outcome_counts += _roll_blocks(seed, range(num_blocks), num_simulations, block_size)
+        else:
+            # 區塊輪流分配給各分片
+            shards = [list(range(i, num_blocks, workers)) for i in range(min(workers, num_blocks))]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for counts in executor.map(_roll_blocks, [seed] * len(shards), shards,
+                                           [num_simulations] * len(shards), [block_size] * len(shards)):
+                    batch.outcome_counts += counts
+        batch.version += 1
+        self.accumulator.merge(batch)
+        return batch.statistics()
+
+    def simulate_until(self, tolerance=0.001, bets=None, confidence=0.95, batch_size=100_000,
+                       max_rolls=100_000_000, rng=None):
+        """自適應模擬: 分批投擲直到每個押注RTP的信賴區間半寬都不超過 tolerance
+
+        bets: 押注類型或 (押注類型, 選項) 的清單，預設為所有不需指定選項的押注
+        投擲次數達到 max_rolls 時停止，converged 表示是否達到要求的精確度。
+        結果與 simulate_batch_rolls 相同會併入 accumulator，返回每個押注的RTP估計值與達到的精確度。
+        """
+        if max_rolls < 2:
+            raise ValueError("max_rolls 至少為 2 (至少 2 次投擲才能估計精確度)")
+        self._sync_history()
+        table = self.settlement_table
+        if bets is None:
+            bets = [bet for bet in table.bets if bet[1] is None]
+        bets = [bet if isinstance(bet, tuple) else (bet, None) for bet in bets]
+        bet_ids = [table.bet_id(bet_type, selection) for bet_type, selection in bets]
+        if rng is None:
+            rng = self.rng if self.rng is not None else np.random.default_rng()
+        # DiceStream 只產生骰子，隨機倍數另以 (seed, 玩家, 目前局數) 衍生的產生器抽樣
+        multiplier_rng = rng
+        if isinstance(rng, DiceStream):
+            multiplier_rng = np.random.default_rng(
+                np.random.SeedSequence(rng.seed, spawn_key=(rng.player, 1, rng.position)))
+        running = RunningStats()
+        rolls = 0
+        while rolls < max_rolls:
+            size = min(batch_size, max_rolls - rolls)
+            codes = encode_dice(self.roll_dice_batch(size, rng))
+            if self.compact_history:
+                self.results_history.extend_codes(codes)
+            self.accumulator.add_codes(codes)
+            running.add(np.column_stack([table.sample(codes, bet_id, multiplier_rng) for bet_id in bet_ids]))
+            rolls += size
+            if running.count > 1 and running.half_width(confidence).max() <= tolerance:
+                break
+
+        half_width = running.half_width(confidence)
+        estimates = {}
+        for (bet_type, selection), mean, error, width in zip(bets, running.mean, running.std_error, half_width):
+            name = bet_type if selection is None else f"{bet_type} [{selection}]"
+            estimates[name] = {
+                "rtp": float(mean),
+                "std_error": float(error),
+                "half_width": float(width),
+                "ci": [float(mean - width), float(mean + width)],
+            }
+        return {
+            "rolls": rolls,
+            "converged": bool(half_width.max() <= tolerance),
+            "tolerance": tolerance,
+            "confidence": confidence,
+            "estimates": estimates,
         }
-        
-        # 計算總點數出現的頻率
-        for result in self.results_history:
-            stats["點數總和"][result["total"]] += 1
-            
-            # 計算各點數出現1,2,3次的頻率
-            for num in range(1, 7):
-                count = result["counts"][num]
-                if count > 0:
-                    stats["點數出現次數"][num][count] += 1
-        
-        # 轉換為百分比
-        for total in stats["點數總和"]:
-            stats["點數總和"][total] /= total_rolls
-            
-        for num in stats["點數出現次數"]:
-            for count in stats["點數出現次數"][num]:
-                stats["點數出現次數"][num][count] /= total_rolls
-                
-        # 計算雙骰組合出現的機率
-        stats["雙骰組合"] = {}
-        for i in range(1, 7):
-            for j in range(i, 7):
-                if i != j:  # 不同點數的組合
-                    key = f"{i},{j}"
-                    count = sum(1 for r in self.results_history if 
-                                self.check_pair(r["dice"], i, j))
-                    stats["雙骰組合"][key] = count / total_rolls
-                    
-        return stats
+
+    def calculate_statistics(self):
+        """計算統計資訊 (讀取累計器，加入新結果前不會重新計算)"""
+        self._sync_history()
+        return self.accumulator.statistics()
     
+    def calculate_exact_statistics(self):
+        """以 216 種等機率結果精確計算機率，格式與 calculate_statistics 相同
+
+        "總模擬次數" 為結果空間大小 216
+        """
+        return statistics_from_features(outcome_features())
+
+    def calculate_exact_expected_value(self):
+        """精確計算 bet_types 中每個押注的勝率、期望值、莊家優勢與變異數
+
+        期望值的定義與 calculate_expected_value 相同: 每單位押注的平均回收 (含本金)。
+        單骰點數、雙骰組合與三骰組合會依指定的點數/組合分別列出。
+        結果依賠率表快取於整個行程，請勿直接修改返回的字典。
+        """
+        return _exact_bet_analysis(paytable_key(self.bet_types))
+
     def calculate_expected_value(self, bet_amount=100):
         """計算各種投注的期望值
         
@@ -249,6 +1184,11 @@ class SicBoSimulator:
         以模擬的角度來說:
         EV = All Win / (Bet * 下注次數)
         """
+        self._sync_history()
+        cache_key = (self.accumulator.version, paytable_key(self.bet_types))
+        if self._ev_cache is not None and self._ev_cache[0] == cache_key:
+            return self._ev_cache[1]
+
         stats = self.calculate_statistics()
         if isinstance(stats, str):
             return "沒有模擬數據，無法計算期望值"
@@ -316,19 +1256,42 @@ class SicBoSimulator:
             if f"{x}_HI" in self.bet_types:
                 payout = self.bet_types[f"{x}_HI"]["payout"]
                 ev["X_HI"][x] = win_prob * (1 + payout)
+        
+        # 隨機倍數投注: 模擬的結果分佈乘上每種結果的平均回收倍數 (依倍數權重加權)
+        table = self.settlement_table
+        random_ev = self.accumulator.outcome_counts @ table.table / self.accumulator.total_rolls
+        for bet_id in table.choices:
+            bet_type, selection = table.bets[bet_id]
+            if selection is None:
+                ev[bet_type] = float(random_ev[bet_id])
+            else:
+                ev.setdefault(bet_type, {})[selection] = float(random_ev[bet_id])
             
+        self._ev_cache = (cache_key, ev)
         return ev
     
     def visualize_results(self):
         """視覺化模擬結果 - 已停用圖表生成"""
-        if not self.results_history:
-            return "沒有模擬數據可視覺化"
-        
         stats = self.calculate_statistics()
+        if isinstance(stats, str):
+            return "沒有模擬數據可視覺化"
         
         # 圖表生成功能已停用
         return "圖表生成已停用，請查看文字統計結果"
 
+    def print_exact_results(self):
+        """打印精確計算的各押注期望值與莊家優勢"""
+        print("精確期望值 (216 種結果):")
+        for bet_type, analysis in self.calculate_exact_expected_value().items():
+            if "expected_value" in analysis:
+                analysis = {None: analysis}
+            for selection, values in analysis.items():
+                name = bet_type if selection is None else f"{bet_type} [{selection}]"
+                print(f"  {name}: 勝率 {values['win_probability']:.4f}, "
+                      f"期望值 {values['expected_value']:.4f}, "
+                      f"莊家優勢 {values['house_edge']:.4%}, "
+                      f"變異數 {values['variance']:.4f}")
+
     def print_results(self):
         """打印模擬結果和統計資訊"""
         stats = self.calculate_statistics()
@@ -424,3 +1387,11 @@ class SicBoSimulator:
         for x in range(3, 7):
             if x in ev['X_HI']:
                 print(f"  {x}_HI: {ev['X_HI'][x]:.2f}")
+        
+        print("\n隨機倍數投注 (依倍數權重):")
+        for bet_id in self.settlement_table.choices:
+            bet_type, selection = self.settlement_table.bets[bet_id]
+            if selection is None:
+                print(f"  {bet_type}: {ev[bet_type]:.2f}")
+            else:
+                print(f"  {bet_type} [{selection}]: {ev[bet_type][selection]:.2f}")
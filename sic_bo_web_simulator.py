@@ -2,21 +2,74 @@
 骰寶網頁模擬器 - 計算玩家RTP (Return to Player)
 """
 
-from sic_bo_simulator import SicBoSimulator
+from sic_bo_simulator import (SicBoSimulator, DiceStream, RunningStats, bet_selections, confidence_z,
+                              encode_dice, outcome_dice, outcome_features, parse_selection, paytable_version,
+                              resolve_seed, settlement_table, SettlementTable)
 import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+from sic_bo_jobs import JobManager
+from sic_bo_cache import ResultCache
+from sic_bo_bankroll import exact_bankroll_distribution
+from sic_bo_metrics import REGISTRY
+from sic_bo_archive import PlayerArchiveWriter
 import flask
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
+import functools
+import gzip
+import hashlib
+import json
 import os
+import time
+from datetime import datetime, timezone
 
-app = Flask(__name__, template_folder="templates")
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+app = Flask(__name__)
+
+# 背景模擬工作池 (/jobs)
+job_manager = JobManager(max_workers=int(os.environ.get('SICBO_JOB_WORKERS', 2)),
+                         max_result_bytes=int(os.environ.get('SICBO_JOB_MAX_RESULT_BYTES', 256 * 1024 * 1024)),
+                         result_ttl=int(os.environ.get('SICBO_JOB_RESULT_TTL', 3600)))
+
+# 指定 seed 的 /simulate 結果快取 (SICBO_CACHE_DIR 設定時啟用磁碟層)
+result_cache = ResultCache(max_bytes=int(os.environ.get('SICBO_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+                           disk_dir=os.environ.get('SICBO_CACHE_DIR') or None)
+
+# 監控指標 (/metrics)；平行模式在子行程中的階段時間不會計入
+SIMULATE_REQUESTS = REGISTRY.counter("sicbo_simulate_requests_total", "/simulate 請求數", ["mode", "status"])
+SIMULATE_SECONDS = REGISTRY.histogram("sicbo_simulate_request_seconds", "/simulate 請求處理秒數", ["mode"])
+STAGE_SECONDS = REGISTRY.histogram("sicbo_stage_seconds", "模擬各階段的秒數", ["stage"])
+ROLLS = REGISTRY.counter("sicbo_rolls_total", "模擬的投擲局數", ["engine"])
+ROLLS_PER_SECOND = REGISTRY.gauge("sicbo_rolls_per_second", "最近一次 /simulate 請求的每秒模擬局數", ["mode"])
+RESPONSE_BYTES = REGISTRY.histogram("sicbo_response_bytes", "/simulate 回應大小 (bytes)", ["mode"],
+                                    buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8))
 
 # 模擬單個玩家的下注流程
-def simulate_player(player_id, num_games, bet_amount, initial_capital, bet_type):
-    simulator = SicBoSimulator()
+def simulate_player(player_id, num_games, bet_amount, initial_capital, bet_type, seed=None, selection=None):
+    # 指定 seed 時使用 (seed, player_id) 的骰子串流，結果與向量化引擎相同
+    simulator = SicBoSimulator(rng=DiceStream(seed, player_id) if seed is not None else None)
+    # 查表結算: 每種結果代碼對應的回收倍數 (含本金，輸則為 0)
+    table = simulator.settlement_table
+    bet_id = table.bet_id(bet_type, selection)
+    settle = table.scalar_settler(bet_id)
+    # 隨機倍數押注: 每局抽一個 [0, 1) 亂數決定倍數
+    if table.is_random(bet_id):
+        if seed is not None:
+            uniforms = DiceStream(seed, player_id, lane=MULTIPLIER_LANE).uniforms(0, num_games).tolist()
+        else:
+            uniforms = [random.random() for _ in range(num_games)]
     capital = initial_capital
     history = []
     total_bet = 0  # 總押注金額
     total_win = 0  # 總獲獎金額
+    # 逐局迴圈同時擲骰、結算與記錄，整段計為一個階段
+    loop_start = time.perf_counter()
     
     for game in range(num_games):
         if capital <= 0:  # 破產了
@@ -33,24 +86,11 @@ def simulate_player(player_id, num_games, bet_amount, initial_capital, bet_type)
         result = simulator.simulate_single_roll()
         
         # 判斷是否贏了
-        won = False
-        if bet_type == "高 (HI)" and result["is_hi"]:
-            won = True
-            payout = simulator.bet_types["高 (HI)"]["payout"]
-            winnings = bet * (1 + payout)
-            total_win += winnings  # 記錄獲獎金額
-        elif bet_type == "低 (LO)" and result["is_lo"]:
-            won = True
-            payout = simulator.bet_types["低 (LO)"]["payout"]
-            winnings = bet * (1 + payout)
-            total_win += winnings  # 記錄獲獎金額
-        elif bet_type == "11 HI-LO" and result["is_hi_lo_11"]:
-            won = True
-            payout = simulator.bet_types["11 HI-LO"]["payout"]
-            winnings = bet * (1 + payout)
-            total_win += winnings  # 記錄獲獎金額
-        else:
-            winnings = 0
+        code = encode_dice(result["dice"])
+        multiplier = settle(code, uniforms[game]) if table.is_random(bet_id) else settle(code)
+        won = multiplier > 0
+        winnings = bet * multiplier
+        total_win += winnings  # 記錄獲獎金額
             
         # 更新資金
         capital = capital - bet + winnings
@@ -66,6 +106,9 @@ def simulate_player(player_id, num_games, bet_amount, initial_capital, bet_type)
             "capital": capital
         })
     
+    STAGE_SECONDS.observe(time.perf_counter() - loop_start, stage="scalar_player")
+    ROLLS.inc(len(history), engine="scalar")
+    
     # 計算正確的 RTP（總獲獎金額/總押注金額）
     player_rtp = total_win / total_bet if total_bet > 0 else 0
     
@@ -81,11 +124,12 @@ def simulate_player(player_id, num_games, bet_amount, initial_capital, bet_type)
     }
 
 # 模擬多個玩家的下注流程
-def simulate_multiple_players(num_players, num_games, bet_amount, initial_capital, bet_type):
+def simulate_multiple_players(num_players, num_games, bet_amount, initial_capital, bet_type, seed=None,
+                              selection=None):
     results = []
     
     for i in range(num_players):
-        player_result = simulate_player(i+1, num_games, bet_amount, initial_capital, bet_type)
+        player_result = simulate_player(i+1, num_games, bet_amount, initial_capital, bet_type, seed, selection)
         results.append(player_result)
     
     # 計算整體RTP（所有玩家總獲獎金額/總押注金額）
@@ -97,448 +141,947 @@ def simulate_multiple_players(num_players, num_games, bet_amount, initial_capita
         "results": results,
         "overall_rtp": overall_rtp,
         "bet_type": bet_type,
+        "selection": selection,
         "num_players": num_players,
         "num_games": num_games,
         "bet_amount": bet_amount,
         "initial_capital": initial_capital
     }
 
-# 獲取當前腳本所在目錄
-current_dir = os.path.dirname(os.path.abspath(__file__))
-# 創建 templates 資料夾如果不存在
-templates_dir = os.path.join(current_dir, "templates")
-os.makedirs(templates_dir, exist_ok=True)
-
-# 創建 HTML 模板
-with open(os.path.join(templates_dir, "index.html"), "w", encoding="utf-8") as f:
-    f.write("""
-<!DOCTYPE html>
-<html lang="zh-TW">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>骰寶模擬器 - RTP計算</title>
-    <style>
-        body {
-            font-family: Arial, sans-serif;
-            margin: 0;
-            padding: 20px;
-            background-color: #f0f0f0;
-        }
-        .container {
-            max-width: 1000px;
-            margin: 0 auto;
-            background-color: white;
-            padding: 20px;
-            border-radius: 5px;
-            box-shadow: 0 0 10px rgba(0, 0, 0, 0.1);
-        }
-        h1 {
-            color: #333;
-            text-align: center;
-        }
-        .form-group {
-            margin-bottom: 15px;
-        }
-        label {
-            display: block;
-            margin-bottom: 5px;
-            font-weight: bold;
-        }
-        input, select {
-            width: 100%;
-            padding: 8px;
-            border: 1px solid #ddd;
-            border-radius: 4px;
-            box-sizing: border-box;
-        }
-        button {
-            background-color: #4CAF50;
-            color: white;
-            padding: 10px 15px;
-            border: none;
-            border-radius: 4px;
-            cursor: pointer;
-            font-size: 16px;
-        }
-        button:hover {
-            background-color: #45a049;
-        }
-        .results {
-            margin-top: 20px;
-        }
-        .loading {
-            text-align: center;
-            margin-top: 20px;
-            display: none;
-        }
-        .error {
-            color: red;
-            margin-top: 10px;
-        }
-        table {
-            width: 100%;
-            border-collapse: collapse;
-            margin-top: 20px;
-        }
-        th, td {
-            padding: 8px;
-            text-align: left;
-            border-bottom: 1px solid #ddd;
-        }
-        th {
-            background-color: #f2f2f2;
-        }
-        .card {
-            border: 1px solid #ddd;
-            border-radius: 4px;
-            padding: 15px;
-            margin-bottom: 15px;
-            background-color: #f9f9f9;
-        }
-        .chart-container {
-            width: 100%;
-            height: 400px;
-            margin-top: 20px;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>骰寶模擬器 - RTP計算工具</h1>
-        
-        <div class="form-group">
-            <label for="num_players">玩家數量:</label>
-            <input type="number" id="num_players" value="10" min="1" max="1000">
-        </div>
-        
-        <div class="form-group">
-            <label for="num_games">每位玩家遊戲局數:</label>
-            <input type="number" id="num_games" value="100" min="1" max="10000">
-        </div>
-        
-        <div class="form-group">
-            <label for="bet_amount">每局押注金額:</label>
-            <input type="number" id="bet_amount" value="100" min="1">
-        </div>
-        
-        <div class="form-group">
-            <label for="initial_capital">起始資金:</label>
-            <input type="number" id="initial_capital" value="10000" min="1">
-        </div>
-        
-        <div class="form-group">
-            <label for="bet_type">押注選項:</label>
-            <select id="bet_type">
-                <option value="高 (HI)">高 (HI)</option>
-                <option value="低 (LO)">低 (LO)</option>
-                <option value="11 HI-LO">11 HI-LO</option>
-            </select>
-        </div>
-        
-        <button onclick="runSimulation()">運行模擬</button>
-        
-        <div class="loading" id="loading">
-            <p>模擬運行中，請稍候...</p>
-        </div>
-        
-        <div class="error" id="error"></div>
-        
-        <div class="results" id="results">
-            <!-- 結果將顯示在這裡 -->
-        </div>
-        
-        <!-- 圖表功能已關閉
-        <h2>資金變化圖表</h2>
-        <div class="chart-container" id="capitalChart"></div>
-        
-        <h2>累計RTP與勝率圖表</h2>
-        <div class="chart-container" id="rtpChart"></div>
-        -->
-    </div>
-    
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-    <script>
-        let capitalChart = null;
-        let rtpChart = null;
-        
-        function runSimulation() {
-            const numPlayers = document.getElementById('num_players').value;
-            const numGames = document.getElementById('num_games').value;
-            const betAmount = document.getElementById('bet_amount').value;
-            const initialCapital = document.getElementById('initial_capital').value;
-            const betType = document.getElementById('bet_type').value;
-            
-            // 顯示載入中
-            document.getElementById('loading').style.display = 'block';
-            document.getElementById('results').innerHTML = '';
-            document.getElementById('error').innerHTML = '';
-            
-            // 圖表功能已關閉
-            /*
-            // 銷毀舊的圖表
-            if (capitalChart) {
-                capitalChart.destroy();
-                capitalChart = null;
-            }
-            if (rtpChart) {
-                rtpChart.destroy();
-                rtpChart = null;
+# 向量化引擎每次處理的玩家數，限制中間矩陣的記憶體用量
+PLAYER_CHUNK_SIZE = 256
+
+# 隨機倍數押注抽樣使用的 DiceStream lane (骰子為 lane 0)
+MULTIPLIER_LANE = 1
+
+
+def settle_player_rolls(table, bet_id, codes, player_ids, seed):
+    """結算多位玩家的結果代碼矩陣，返回回收倍數矩陣
+
+    codes 的每一列為一位玩家；隨機倍數押注的倍數由 (seed, 玩家編號) 的 MULTIPLIER_LANE 串流抽出。
+    """
+    uniforms = None
+    if table.is_random(bet_id):
+        uniforms = np.empty(codes.shape)
+        for row, player_id in enumerate(player_ids):
+            uniforms[row] = DiceStream(seed, player_id, lane=MULTIPLIER_LANE).uniforms(0, codes.shape[1])
+    return table.settle(codes, bet_id, uniforms)
+
+
+def simulate_bankrolls(returns, bet_amount, initial_capital):
+    """以矩陣運算模擬多位玩家的資金變化
+
+    returns: (玩家數, 局數) 的回收倍數矩陣，每單位押注的回收 (含本金，輸則為 0)
+    bet_amount, initial_capital: 純量或每位玩家一個值的陣列
+    規則與 simulate_player 相同: 資金不足時全押剩餘資金，資金歸零即停止。
+
+    資金足夠時每局押注固定，資金路徑即為淨輸贏的累積和；
+    只有在資金低於押注金額時才逐局處理全押，回到足夠資金後再以累積和接續。
+    返回 bets、winnings、capital (每局結束後資金) 三個矩陣及 games_played。
+    """
+    returns = np.asarray(returns, dtype=float)
+    num_players, num_games = returns.shape
+    bet_amount = np.broadcast_to(np.asarray(bet_amount, dtype=float), (num_players,))
+    initial_capital = np.broadcast_to(np.asarray(initial_capital, dtype=float), (num_players,))
+
+    bets = np.repeat(bet_amount[:, None], num_games, axis=1)
+    if num_games == 0:
+        return {"bets": bets, "winnings": bets.copy(), "capital": bets.copy(),
+                "games_played": np.zeros(num_players, dtype=np.int64)}
+    # 以固定押注計算的資金累積變化，cum_before[:, g] 為第 g 局開始前的累積變化
+    cum = np.cumsum(bets * (returns - 1), axis=1)
+    cum_before = np.zeros_like(cum)
+    cum_before[:, 1:] = cum[:, :-1]
+
+    capital = np.empty_like(cum)
+    games_played = np.full(num_players, num_games)
+    # 每位玩家目前這段固定押注區間的起點，以及起點資金扣除累積變化後的基準值
+    start = np.zeros(num_players, dtype=np.int64)
+    base = initial_capital.copy()
+    columns = np.arange(num_games)
+
+    pending = np.arange(num_players)
+    while pending.size:
+        segment = columns >= start[pending, None]
+        before = base[pending, None] + cum_before[pending]
+        short = segment & (before < bet_amount[pending, None])
+        stop = np.where(short.any(axis=1), short.argmax(axis=1), num_games)
+        in_segment = segment & (columns < stop[:, None])
+        capital[pending] = np.where(in_segment, base[pending, None] + cum[pending], capital[pending])
+
+        still_pending = []
+        for row, player in enumerate(pending):
+            game = stop[row]
+            if game == num_games:
+                continue
+            # 資金不足: 逐局全押，直到破產或資金回到押注金額以上
+            current = before[row, game]
+            while game < num_games and current < bet_amount[player]:
+                if current <= 0:
+                    break
+                bets[player, game] = current
+                current = current * returns[player, game]
+                capital[player, game] = current
+                game += 1
+            if current <= 0:
+                games_played[player] = game
+            elif game < num_games:
+                start[player] = game
+                base[player] = current - cum_before[player, game]
+                still_pending.append(player)
+        pending = np.array(still_pending, dtype=np.int64)
+
+    active = columns < games_played[:, None]
+    bets[~active] = 0
+    winnings = bets * returns
+    return {
+        "bets": bets,
+        "winnings": winnings,
+        "capital": capital,
+        "games_played": games_played,
+    }
+
+
+def simulate_multiple_players_vectorized(num_players, num_games, bet_amount, initial_capital, bet_type,
+                                         seed=None, include_history=True, selection=None):
+    """向量化版本的 simulate_multiple_players，返回相同結構的結果
+
+    seed: 亂數種子，每位玩家使用 DiceStream(seed, 玩家編號)，
+          任一位玩家的任一段局數都可以單獨重現
+    include_history: 是否建立每局的歷史紀錄
+    """
+    results = _simulate_player_range(1, num_players, num_games, bet_amount, initial_capital, bet_type,
+                                     resolve_seed(seed), include_history, selection)
+    return _summarize_players(results, num_players, num_games, bet_amount, initial_capital, bet_type, selection)
+
+
+# 平行模式共用的工作程序池，第一次使用時建立
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool():
+    """整個行程共用的工作程序池 (工作程序數為 CPU 數)
+
+    網頁行程同時有工作池與監控指標的執行緒，以 fork 建立子行程可能複製到被其他執行緒持有的鎖而卡住，
+    因此以 forkserver (不支援時為 spawn) 啟動工作程序。
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                mp_context=multiprocessing.get_context(method))
+        return _process_pool
+
+
+def simulate_multiple_players_parallel(num_players, num_games, bet_amount, initial_capital, bet_type,
+                                       seed=None, workers=None, include_history=True, selection=None):
+    """把玩家切成多個分片，以多個工作程序平行模擬
+
+    每位玩家的亂數串流只由 (seed, 玩家編號) 決定，
+    因此同一個 seed 不論 workers 為多少都得到相同結果。
+    分片由共用的工作程序池 (_get_process_pool) 執行，workers 為分片數。
+    """
+    seed = resolve_seed(seed)
+    workers = workers or os.cpu_count() or 1
+    shard_size = max(1, -(-num_players // workers))
+    first_players = list(range(1, num_players + 1, shard_size))
+    shard_sizes = [min(shard_size, num_players - first + 1) for first in first_players]
+    results = []
+    for shard_results in _get_process_pool().map(
+            _simulate_player_range, first_players, shard_sizes,
+            *([value] * len(first_players) for value in
+              (num_games, bet_amount, initial_capital, bet_type, seed, include_history, selection))):
+        results.extend(shard_results)
+    return _summarize_players(results, num_players, num_games, bet_amount, initial_capital, bet_type, selection)
+
+
+def _iter_player_chunks(first_player, num_players, num_games, bet_amount, initial_capital, bet_type, seed,
+                        selection=None):
+    """逐段模擬玩家，每段產生 (玩家編號, 結果代碼矩陣, simulate_bankrolls 的結果)"""
+    table = SicBoSimulator().settlement_table
+    bet_id = table.bet_id(bet_type, selection)
+    for chunk_start in range(0, num_players, PLAYER_CHUNK_SIZE):
+        chunk_players = min(PLAYER_CHUNK_SIZE, num_players - chunk_start)
+        player_ids = range(first_player + chunk_start, first_player + chunk_start + chunk_players)
+        with STAGE_SECONDS.time(stage="dice"):
+            codes = np.empty((chunk_players, num_games), dtype=np.uint8)
+            for row, player_id in enumerate(player_ids):
+                codes[row] = DiceStream(seed, player_id).codes(0, num_games)
+        with STAGE_SECONDS.time(stage="settlement"):
+            returns = settle_player_rolls(table, bet_id, codes, player_ids, seed)
+            arrays = simulate_bankrolls(returns, bet_amount, initial_capital)
+        ROLLS.inc(codes.size, engine="vectorized")
+        yield player_ids, codes, arrays
+
+
+def _simulate_player_range(first_player, num_players, num_games, bet_amount, initial_capital, bet_type,
+                           seed, include_history, selection=None):
+    """模擬編號 first_player 起連續 num_players 位玩家，返回每位玩家的結果"""
+    results = []
+
+    for player_ids, codes, arrays in _iter_player_chunks(first_player, num_players, num_games, bet_amount,
+                                                         initial_capital, bet_type, seed, selection):
+        history_start = time.perf_counter()
+        total_bets = arrays["bets"].sum(axis=1)
+        total_wins = arrays["winnings"].sum(axis=1)
+
+        for row, player_id in enumerate(player_ids):
+            played = int(arrays["games_played"][row])
+            player_result = {
+                "player_id": player_id,
+                "initial_capital": initial_capital,
+                "final_capital": float(arrays["capital"][row, played - 1]) if played else initial_capital,
+                "games_played": played,
+                "history": _build_history(codes[row, :played], arrays["bets"][row, :played],
+                                          arrays["winnings"][row, :played],
+                                          arrays["capital"][row, :played]) if include_history else [],
+                "total_bet": float(total_bets[row]),
+                "total_win": float(total_wins[row]),
+                "rtp": float(total_wins[row] / total_bets[row]) if total_bets[row] > 0 else 0
             }
-            */
-            
-            // 發送API請求
-            fetch('/simulate', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    num_players: parseInt(numPlayers),
-                    num_games: parseInt(numGames),
-                    bet_amount: parseInt(betAmount),
-                    initial_capital: parseInt(initialCapital),
-                    bet_type: betType
-                })
-            })
-            .then(response => response.json())
-            .then(data => {
-                // 隱藏載入中
-                document.getElementById('loading').style.display = 'none';
-                
-                // 顯示結果
-                displayResults(data);
+            results.append(player_result)
+        STAGE_SECONDS.observe(time.perf_counter() - history_start, stage="history")
+    return results
+
+
+def aggregate_multiple_players(num_players, num_games, bet_amount, initial_capital, bet_type, seed=None,
+                               points=None, selection=None, progress=None):
+    """只返回每局的彙總數據，不建立每局的歷史紀錄
+
+    aggregates 中每個陣列的第 i 個值對應第 game[i] 局:
+    avg_capital 為仍在遊戲的玩家局後平均資金，active_players 為該局仍在遊戲的玩家數，
+    win_rate 為該局獲勝玩家的比例，cumulative_rtp 為到該局為止所有玩家的總獲獎/總押注。
+    points: 均勻抽樣的資料點數上限，未指定時返回每一局。
+    progress: 每段玩家完成後以 (已完成的玩家數, 已完成的局數) 呼叫
+    """
+    seed = resolve_seed(seed)
+    capital_sum = np.zeros(num_games)
+    active_players = np.zeros(num_games, dtype=np.int64)
+    wins = np.zeros(num_games, dtype=np.int64)
+    bet_sum = np.zeros(num_games)
+    win_sum = np.zeros(num_games)
+    players = []
+
+    for player_ids, codes, arrays in _iter_player_chunks(1, num_players, num_games, bet_amount,
+                                                         initial_capital, bet_type, seed, selection):
+        active = np.arange(num_games) < arrays["games_played"][:, None]
+        capital_sum += np.where(active, arrays["capital"], 0).sum(axis=0)
+        active_players += active.sum(axis=0)
+        wins += (arrays["winnings"] > 0).sum(axis=0)
+        bet_sum += arrays["bets"].sum(axis=0)
+        win_sum += arrays["winnings"].sum(axis=0)
+        total_bets = arrays["bets"].sum(axis=1)
+        total_wins = arrays["winnings"].sum(axis=1)
+        for row, player_id in enumerate(player_ids):
+            played = int(arrays["games_played"][row])
+            players.append({
+                "player_id": player_id,
+                "final_capital": float(arrays["capital"][row, played - 1]) if played else initial_capital,
+                "games_played": played,
+                "total_bet": float(total_bets[row]),
+                "total_win": float(total_wins[row]),
+                "rtp": float(total_wins[row] / total_bets[row]) if total_bets[row] > 0 else 0
             })
-            .catch(error => {
-                // 隱藏載入中
-                document.getElementById('loading').style.display = 'none';
-                
-                // 顯示錯誤
-                document.getElementById('error').innerHTML = '發生錯誤: ' + error.message;
-                console.error('Error:', error);
-            });
-        }
-        
-        function displayResults(data) {
-            const resultsDiv = document.getElementById('results');
-            
-            // 整體RTP卡片
-            const overallRtpCard = document.createElement('div');
-            overallRtpCard.className = 'card';
-            overallRtpCard.innerHTML = `
-                <h2>整體模擬結果</h2>
-                <p><strong>押注選項:</strong> ${data.bet_type}</p>
-                <p><strong>玩家數量:</strong> ${data.num_players}</p>
-                <p><strong>每位玩家遊戲局數:</strong> ${data.num_games}</p>
-                <p><strong>每局押注金額:</strong> ${data.bet_amount}</p>
-                <p><strong>起始資金:</strong> ${data.initial_capital}</p>
-                <p><strong>整體RTP (Return to Player):</strong> ${(data.overall_rtp * 100).toFixed(2)}%</p>
-            `;
-            resultsDiv.appendChild(overallRtpCard);
-            
-            // 創建綜合圖表數據
-            const chartLabels = Array.from({length: data.num_games}, (_, i) => i + 1);
-            
-            // 計算每局的平均資金和RTP
-            const avgCapitalByGame = Array(data.num_games).fill(0);
-            const rtpByGame = Array(data.num_games).fill(0);
-            const winRateByGame = Array(data.num_games).fill(0);
-            let activePlayers = Array(data.num_games).fill(0);
-            
-            // 用於累積計算每局的總下注和總贏金
-            const totalBetByGame = Array(data.num_games).fill(0);
-            const totalWinByGame = Array(data.num_games).fill(0);
-            
-            // 對每個玩家的每局進行統計
-            data.results.forEach(player => {
-                player.history.forEach((game, index) => {
-                    if (index < data.num_games) {
-                        avgCapitalByGame[index] += game.capital;
-                        totalBetByGame[index] += game.bet_amount;
-                        totalWinByGame[index] += game.won ? game.winnings : 0;
-                        winRateByGame[index] += game.won ? 1 : 0;
-                        activePlayers[index] += 1;
-                    }
-                });
-            });
-            
-            // 計算累積的RTP
-            for (let i = 0; i < data.num_games; i++) {
-                let cumTotalBet = 0;
-                let cumTotalWin = 0;
-                
-                for (let j = 0; j <= i; j++) {
-                    cumTotalBet += totalBetByGame[j];
-                    cumTotalWin += totalWinByGame[j];
-                }
-                
-                rtpByGame[i] = cumTotalBet > 0 ? cumTotalWin / cumTotalBet : 0;
-            }
-            
-            // 計算平均值
-            for (let i = 0; i < data.num_games; i++) {
-                if (activePlayers[i] > 0) {
-                    avgCapitalByGame[i] /= activePlayers[i];
-                    rtpByGame[i] /= activePlayers[i];
-                    winRateByGame[i] = (winRateByGame[i] / activePlayers[i]) * 100;
-                }
-            }
-            
-            // 圖表功能已關閉
-            /*
-            // 創建資金變化圖表
-            const capitalCtx = document.createElement('canvas');
-            document.getElementById('capitalChart').innerHTML = '';
-            document.getElementById('capitalChart').appendChild(capitalCtx);
-            
-            capitalChart = new Chart(capitalCtx, {
-                type: 'line',
-                data: {
-                    labels: chartLabels,
-                    datasets: [{
-                        label: '平均資金',
-                        data: avgCapitalByGame,
-                        borderColor: 'rgb(54, 162, 235)',
-                        backgroundColor: 'rgba(54, 162, 235, 0.2)',
-                        fill: true
-                    }]
-                },
-                options: {
-                    responsive: true,
-                    plugins: {
-                        title: {
-                            display: true,
-                            text: '平均資金變化'
-                        },
-                        tooltip: {
-                            mode: 'index',
-                            intersect: false
-                        }
-                    },
-                    scales: {
-                        x: {
-                            display: true,
-                            title: {
-                                display: true,
-                                text: '局數'
-                            }
-                        },
-                        y: {
-                            display: true,
-                            title: {
-                                display: true,
-                                text: '平均資金'
-                            }
-                        }
-                    }
-                }
-            });
-            
-            // 創建累計RTP和勝率圖表
-            const rtpCtx = document.createElement('canvas');
-            document.getElementById('rtpChart').innerHTML = '';
-            document.getElementById('rtpChart').appendChild(rtpCtx);
-            
-            rtpChart = new Chart(rtpCtx, {
-                type: 'line',
-                data: {
-                    labels: chartLabels,
-                    datasets: [
-                        {
-                            label: '累計RTP (%)',
-                            data: rtpByGame.map(v => v * 100),
-                            borderColor: 'rgb(255, 99, 132)',
-                            backgroundColor: 'rgba(255, 99, 132, 0.2)',
-                            fill: false,
-                            yAxisID: 'y'
-                        },
-                        {
-                            label: '勝率 (%)',
-                            data: winRateByGame,
-                            borderColor: 'rgb(75, 192, 192)',
-                            backgroundColor: 'rgba(75, 192, 192, 0.2)',
-                            fill: false,
-                            yAxisID: 'y'
-                        }
-                    ]
-                },
-                options: {
-                    responsive: true,
-                    plugins: {
-                        title: {
-                            display: true,
-                            text: '累計RTP與勝率'
-                        },
-                        tooltip: {
-                            mode: 'index',
-                            intersect: false
-                        }
-                    },
-                    scales: {
-                        x: {
-                            display: true,
-                            title: {
-                                display: true,
-                                text: '局數'
-                            }
-                        },
-                        y: {
-                            display: true,
-                            title: {
-                                display: true,
-                                text: '百分比 (%)'
-                            },
-                            min: 0,
-                            max: 120
-                        }
-                    }
-                }
-            });
-            */
+        if progress is not None:
+            progress(len(players), int(active_players.sum()))
+
+    # 累計RTP以前綴和計算
+    cum_bet = np.cumsum(bet_sum)
+    cum_win = np.cumsum(win_sum)
+    safe_active = np.maximum(active_players, 1)
+    games = np.arange(num_games)
+    if points is not None and 0 < points < num_games:
+        games = np.unique(np.linspace(0, num_games - 1, points).round().astype(np.int64))
+
+    total_bet = float(bet_sum.sum())
+    total_win = float(win_sum.sum())
+    return {
+        "mode": "aggregate",
+        "overall_rtp": total_win / total_bet if total_bet > 0 else 0,
+        "bet_type": bet_type,
+        "selection": selection,
+        "num_players": num_players,
+        "num_games": num_games,
+        "bet_amount": bet_amount,
+        "initial_capital": initial_capital,
+        "players": players,
+        "aggregates": {
+            "game": (games + 1).tolist(),
+            "avg_capital": (capital_sum / safe_active)[games].tolist(),
+            "active_players": active_players[games].tolist(),
+            "win_rate": (wins / safe_active)[games].tolist(),
+            "cumulative_rtp": np.divide(cum_win, cum_bet, out=np.zeros(num_games), where=cum_bet > 0)[games].tolist(),
         }
-        
-        function getRandomColor(index) {
-            const colors = [
-                'rgb(255, 99, 132)', // 紅色
-                'rgb(54, 162, 235)', // 藍色
-                'rgb(255, 206, 86)', // 黃色
-                'rgb(75, 192, 192)', // 青色
-                'rgb(153, 102, 255)', // 紫色
-                'rgb(255, 159, 64)', // 橙色
-                'rgb(199, 199, 199)' // 灰色
-            ];
-            
-            return colors[index % colors.length];
+    }
+
+
+# 自適應模式的總局數上限 (玩家數 x 局數)，與一般模式的上限 1000 位玩家 x 10000 局相同
+ADAPTIVE_MAX_GAMES = 1000 * 10000
+
+
+def adaptive_multiple_players(num_games, bet_amount, initial_capital, bet_type, tolerance=0.01, confidence=0.95,
+                              max_players=100000, seed=None, selection=None, control_variates=False):
+    """自適應模式: 逐段增加玩家，直到整體RTP的信賴區間半寬不超過 tolerance 或達到 max_players
+
+    整體RTP為 總獲獎/總押注 (比率估計)，標準誤以每位玩家的 (獲獎 - RTP x 押注) 線性化計算。
+    control_variates 為 True 時，以每位玩家的 Σ押注 x (是否HI/LO - 精確機率) 作為控制變量
+    (期望值為 0)，迴歸修正總獲獎與總押注，並以 vrf 返回變異數縮減倍數。
+    只返回整體結果與達到的精確度，不返回每位玩家的資料。
+    """
+    seed = resolve_seed(seed)
+    features = outcome_features()
+    running = RunningStats()  # 每位玩家的 (總獲獎, 總押注[, HI 控制變量, LO 控制變量])
+    half_width = float("inf")
+    rtp = 0.0
+    vrf = 1.0
+    while running.count < max_players:
+        chunk_players = min(PLAYER_CHUNK_SIZE, max_players - running.count)
+        for _, codes, arrays in _iter_player_chunks(running.count + 1, chunk_players, num_games, bet_amount,
+                                                    initial_capital, bet_type, seed, selection):
+            columns = [arrays["winnings"].sum(axis=1), arrays["bets"].sum(axis=1)]
+            if control_variates:
+                for name in ("is_hi", "is_lo"):
+                    flags = features[name]
+                    columns.append((arrays["bets"] * (flags[codes] - flags.mean())).sum(axis=1))
+            running.add(np.column_stack(columns))
+        rtp, variance, vrf = _ratio_estimate(running)
+        if rtp is None:
+            rtp = 0.0
+            break
+        half_width = confidence_z(confidence) * np.sqrt(variance / running.count)
+        if running.count > 1 and half_width <= tolerance:
+            break
+
+    # JSON 不支援 inf，無法估計精確度時 (例如總押注為 0) 半寬與信賴區間返回 None
+    finite = bool(np.isfinite(half_width))
+    return {
+        "mode": "adaptive",
+        "overall_rtp": float(rtp),
+        "half_width": float(half_width) if finite else None,
+        "ci": [float(rtp - half_width), float(rtp + half_width)] if finite else None,
+        "converged": bool(half_width <= tolerance),
+        "tolerance": tolerance,
+        "confidence": confidence,
+        "control_variates": control_variates,
+        # JSON 不支援 inf，完全消除變異時返回 None
+        "vrf": float(vrf) if vrf is not None and np.isfinite(vrf) else None,
+        "num_players": running.count,
+        "num_games": num_games,
+        "bet_amount": bet_amount,
+        "initial_capital": initial_capital,
+        "bet_type": bet_type,
+        "selection": selection,
+        "avg_total_bet": float(running.mean[1]) if running.count else 0.0,
+        "avg_total_win": float(running.mean[0]) if running.count else 0.0,
+    }
+
+
+def _ratio_estimate(running):
+    """由 (總獲獎, 總押注, 控制變量...) 的累計結果計算RTP、每位玩家的線性化變異數與變異數縮減倍數
+
+    有控制變量時，總獲獎與總押注各自對控制變量迴歸後再取比值。總押注為 0 時返回 (None, None, None)。
+    """
+    mean = running.mean
+    covariance = running.covariance
+    if mean[1] <= 0:
+        return None, None, None
+    plain_rtp = mean[0] / mean[1]
+    plain = np.array([1.0, -plain_rtp] + [0.0] * (len(mean) - 2))
+    plain_variance = plain @ covariance @ plain / mean[1] ** 2
+    if len(mean) == 2:
+        return plain_rtp, plain_variance, 1.0
+
+    controls = covariance[2:, 2:]
+    beta_win = np.linalg.lstsq(controls, covariance[2:, 0], rcond=None)[0]
+    beta_bet = np.linalg.lstsq(controls, covariance[2:, 1], rcond=None)[0]
+    adjusted_bet = mean[1] - beta_bet @ mean[2:]
+    rtp = (mean[0] - beta_win @ mean[2:]) / adjusted_bet
+    weights = np.concatenate([[1.0, -rtp], rtp * beta_bet - beta_win])
+    # 控制變量完全解釋獲獎時 (例如押注本身就是 HI)，變異數只剩捨入誤差
+    variance = max(weights @ covariance @ weights / adjusted_bet ** 2, 0.0)
+    vrf = plain_variance / variance if variance > 1e-12 * plain_variance else float("inf")
+    return rtp, variance, vrf
+
+
+def _summarize_players(results, num_players, num_games, bet_amount, initial_capital, bet_type, selection=None):
+    """合併各玩家結果並計算整體RTP，格式與 simulate_multiple_players 相同"""
+    total_bet = sum(r["total_bet"] for r in results)
+    total_win = sum(r["total_win"] for r in results)
+    overall_rtp = total_win / total_bet if total_bet > 0 else 0
+
+    return {
+        "results": results,
+        "overall_rtp": overall_rtp,
+        "bet_type": bet_type,
+        "selection": selection,
+        "num_players": num_players,
+        "num_games": num_games,
+        "bet_amount": bet_amount,
+        "initial_capital": initial_capital
+    }
+
+
+def iter_player_results(num_players, num_games, bet_amount, initial_capital, bet_type, seed=None,
+                        include_history=True, chunk_size=PLAYER_CHUNK_SIZE, selection=None):
+    """逐段模擬玩家並逐一產生每位玩家的結果
+
+    每次只模擬 chunk_size 位玩家，記憶體用量由 chunk_size 決定而不是整個模擬。
+    結果與 simulate_multiple_players_vectorized 使用同一個 seed 時相同。
+    """
+    seed = resolve_seed(seed)
+    for first_player in range(1, num_players + 1, chunk_size):
+        chunk_players = min(chunk_size, num_players - first_player + 1)
+        yield from _simulate_player_range(first_player, chunk_players, num_games, bet_amount, initial_capital,
+                                          bet_type, seed, include_history, selection)
+
+
+def archive_multiple_players(path, num_players, num_games, bet_amount, initial_capital, bet_type, seed=None,
+                             selection=None):
+    """模擬玩家並把結果代碼、每局押注/獲獎/資金封存到 path (見 sic_bo_archive)
+
+    逐段寫入記憶體映射檔，記憶體用量與 aggregate_multiple_players 相同，不隨玩家數增加。
+    結果與 simulate_multiple_players_vectorized 使用同一個 seed 時相同，返回開啟的 RunArchive。
+    """
+    seed = resolve_seed(seed)
+    params = {"num_players": num_players, "num_games": num_games, "bet_amount": bet_amount,
+              "initial_capital": initial_capital, "bet_type": bet_type, "selection": selection}
+    writer = PlayerArchiveWriter(path, num_players, num_games, SicBoSimulator().bet_types, seed, params)
+    for _, codes, arrays in _iter_player_chunks(1, num_players, num_games, bet_amount, initial_capital,
+                                                bet_type, seed, selection):
+        writer.append(codes, arrays)
+    return writer.close()
+
+
+# 背景工作每次模擬的玩家數
+JOB_PLAYER_CHUNK_SIZE = 50
+
+# 含每局歷史的工作結果中每局約佔的 JSON 大小，用於提交時估計結果大小
+JOB_HISTORY_BYTES_PER_GAME = 120
+
+
+def run_simulation_job(job, num_players, num_games, bet_amount, initial_capital, bet_type, seed=None,
+                       selection=None, mode="full", include_history=True, points=None):
+    """背景工作: 逐位玩家回報已完成的玩家數與局數
+
+    mode 為 "aggregate" 時返回 aggregate_multiple_players 的結果 (每段玩家回報一次進度)；
+    include_history 為 False 時不保留每局歷史，工作結果的大小只與玩家數有關。
+    """
+    job.report(0, games_completed=0)
+    if mode == "aggregate":
+        return aggregate_multiple_players(num_players, num_games, bet_amount, initial_capital, bet_type, seed,
+                                          points, selection,
+                                          progress=lambda players, games: job.report(players, games_completed=games))
+    results = []
+    games_completed = 0
+    for player_result in iter_player_results(num_players, num_games, bet_amount, initial_capital, bet_type,
+                                             seed, include_history=include_history,
+                                             chunk_size=JOB_PLAYER_CHUNK_SIZE, selection=selection):
+        results.append(player_result)
+        games_completed += player_result["games_played"]
+        job.report(len(results), games_completed=games_completed)
+    return _summarize_players(results, num_players, num_games, bet_amount, initial_capital, bet_type, selection)
+
+
+# 串流回應每次模擬的玩家數
+STREAM_PLAYER_CHUNK_SIZE = 16
+
+
+def stream_simulation_ndjson(num_players, num_games, bet_amount, initial_capital, bet_type, seed=None,
+                             selection=None):
+    """以 NDJSON 逐行產生模擬結果
+
+    每位玩家一行 ({"type": "player", ...})，最後一行為整體結果 ({"type": "summary", ...})，
+    伺服器只需保留一段玩家的資料。
+    """
+    total_bet = 0
+    total_win = 0
+    for player_result in iter_player_results(num_players, num_games, bet_amount, initial_capital, bet_type,
+                                             seed, chunk_size=STREAM_PLAYER_CHUNK_SIZE, selection=selection):
+        total_bet += player_result["total_bet"]
+        total_win += player_result["total_win"]
+        yield json.dumps({"type": "player", **player_result}, ensure_ascii=False) + "\n"
+
+    yield json.dumps({
+        "type": "summary",
+        "overall_rtp": total_win / total_bet if total_bet > 0 else 0,
+        "bet_type": bet_type,
+        "selection": selection,
+        "num_players": num_players,
+        "num_games": num_games,
+        "bet_amount": bet_amount,
+        "initial_capital": initial_capital
+    }, ensure_ascii=False) + "\n"
+
+
+# 參數掃描一次最多處理的資金矩陣格數 (玩家數 x 賠率數 x 資金組合數 x 局數)
+SWEEP_MAX_CELLS = 20_000_000
+
+
+def sweep(bet_type, payouts=None, bet_amounts=(100,), initial_capitals=(10000,), num_games=(100,),
+          num_players=100, seed=None, selection=None):
+    """參數掃描: 在 (賠率, 押注金額, 起始資金, 局數) 的網格上計算RTP、破產率與平均最終資金
+
+    所有網格點共用同一組骰子 (與 /simulate 相同的 DiceStream(seed, 玩家編號)) 與隨機倍數亂數：
+    玩家依 PLAYER_CHUNK_SIZE 分段，每段每種賠率只結算一次，再依 (押注金額, 起始資金) 模擬資金並累計各網格點的總和，
+    不同局數取同一條資金路徑的前段。記憶體用量與 aggregate_multiple_players 相同，不隨玩家數與網格大小增加。
+    payouts 為該押注類型的賠率設定清單，未指定時使用目前賠率。返回 columns 與 rows 組成的完整結果表。
+    """
+    seed = resolve_seed(seed)
+    bet_types = SicBoSimulator().bet_types
+    if payouts is None:
+        payouts = [bet_types[bet_type]["payout"]]
+    bankrolls = [(bet, capital) for bet in bet_amounts for capital in initial_capitals]
+    max_games = max(num_games)
+    if num_players * len(payouts) * len(bankrolls) * max_games > SWEEP_MAX_CELLS:
+        raise ValueError(f"掃描規模過大 (玩家數 x 賠率數 x 資金組合數 x 局數不可超過 {SWEEP_MAX_CELLS:,})")
+
+    tables = []
+    for payout in payouts:
+        # JSON 物件的鍵為字串，單骰點數的出現次數轉回整數
+        if isinstance(payout, dict):
+            payout = {int(count): count_payout for count, count_payout in payout.items()}
+        # 每個掃描賠率只使用一次，直接建立結算表，不放入依賠率表的快取
+        table = SettlementTable({bet_type: {**bet_types[bet_type], "payout": payout}})
+        tables.append((table, table.bet_id(bet_type, selection)))
+    exact_rtp = [float(table.table[:, bet_id].mean()) for table, bet_id in tables]
+    any_random = any(table.is_random(bet_id) for table, bet_id in tables)
+
+    # 每個網格點 (賠率, 資金組合, 局數) 的累計值
+    shape = (len(payouts), len(bankrolls), len(num_games))
+    total_bet = np.zeros(shape)
+    total_win = np.zeros(shape)
+    ruined = np.zeros(shape)
+    final_sum = np.zeros(shape)
+    played_sum = np.zeros(shape)
+    game_index = np.array(num_games) - 1
+
+    for chunk_start in range(0, num_players, PLAYER_CHUNK_SIZE):
+        player_ids = range(chunk_start + 1, min(chunk_start + PLAYER_CHUNK_SIZE, num_players) + 1)
+        codes = np.empty((len(player_ids), max_games), dtype=np.uint8)
+        uniforms = np.empty((len(player_ids), max_games)) if any_random else None
+        for row, player_id in enumerate(player_ids):
+            codes[row] = DiceStream(seed, player_id).codes(0, max_games)
+            if any_random:
+                uniforms[row] = DiceStream(seed, player_id, lane=MULTIPLIER_LANE).uniforms(0, max_games)
+
+        for i, (table, bet_id) in enumerate(tables):
+            returns = table.settle(codes, bet_id, uniforms if table.is_random(bet_id) else None)
+            for j, (bet, initial_capital) in enumerate(bankrolls):
+                arrays = simulate_bankrolls(returns, bet, initial_capital)
+                # 到第 games 局為止的總押注與總獲獎: 每局總和的前綴和
+                total_bet[i, j] += np.cumsum(arrays["bets"].sum(axis=0))[game_index]
+                total_win[i, j] += np.cumsum(arrays["winnings"].sum(axis=0))[game_index]
+                for k, games in enumerate(num_games):
+                    played = np.minimum(arrays["games_played"], games)
+                    # 第 games 局結束時的資金 (提前破產的玩家取破產時的資金)
+                    final = np.where(played > 0,
+                                     np.take_along_axis(arrays["capital"], np.maximum(played - 1, 0)[:, None],
+                                                        axis=1)[:, 0],
+                                     initial_capital)
+                    ruined[i, j, k] += (final <= 0).sum()
+                    final_sum[i, j, k] += final.sum()
+                    played_sum[i, j, k] += played.sum()
+
+    rows = []
+    for i, payout in enumerate(payouts):
+        for j, (bet, initial_capital) in enumerate(bankrolls):
+            for k, games in enumerate(num_games):
+                rows.append([payout, bet, initial_capital, games,
+                             float(total_win[i, j, k] / total_bet[i, j, k]) if total_bet[i, j, k] > 0 else 0,
+                             exact_rtp[i], float(ruined[i, j, k] / num_players),
+                             float(final_sum[i, j, k] / num_players), float(played_sum[i, j, k] / num_players)])
+    return {
+        "bet_type": bet_type,
+        "selection": selection,
+        "num_players": num_players,
+        "seed": seed,
+        "columns": ["payout", "bet_amount", "initial_capital", "num_games", "rtp", "exact_rtp",
+                    "ruin_rate", "avg_final_capital", "avg_games_played"],
+        "rows": rows,
+    }
+
+
+# 組合押注每次處理的組合數
+PORTFOLIO_CHUNK_SIZE = 256
+
+
+def portfolio_stakes(portfolios, table):
+    """把每個組合的押注清單轉為 (組合數, 押注數) 的押注金額矩陣
+
+    portfolios 的每個元素為 [{"bet_type": ..., "selection": ..., "amount": ...}, ...]，
+    同一組合中重複的押注金額會相加。
+    """
+    stakes = np.zeros((len(portfolios), len(table.bets)))
+    known_types = {bet_type for bet_type, _ in table.bet_index}
+    for row, portfolio in enumerate(portfolios):
+        for stake in portfolio:
+            bet_type = stake["bet_type"]
+            if bet_type not in known_types:
+                raise ValueError(f"未知的押注類型: {bet_type}")
+            amount = float(stake.get("amount", 0))
+            if amount < 0:
+                raise ValueError("押注金額不可為負數")
+            bet_id = table.bet_id(bet_type, parse_selection(bet_type, stake.get("selection")))
+            stakes[row, bet_id] += amount
+    return stakes
+
+
+def simulate_portfolios(portfolios, num_rounds, seed=None):
+    """組合押注模擬: 每一局同時押注多個選項，所有押注以同一次投擲結算
+
+    每個組合視為一位玩家 (使用 DiceStream(seed, 組合編號))，每局押注金額固定。
+    結算時先以結算表與押注矩陣相乘得到每種結果代碼的總回收 (216 x 組合數)，
+    再依每局的結果代碼取值；隨機倍數押注每局另外抽樣，
+    每個押注使用各自的串流 DiceStream(seed, 組合編號, MULTIPLIER_LANE + 押注編號)，
+    因此組合的結果只由 seed、組合編號與組合內容決定，不受同一請求中其他組合影響。
+    """
+    seed = resolve_seed(seed)
+    table = SicBoSimulator().settlement_table
+    stakes = portfolio_stakes(portfolios, table)
+    random_bets = [bet_id for bet_id in sorted(table.choices) if stakes[:, bet_id].any()]
+    fixed_table = np.array(table.table)
+    fixed_table[:, random_bets] = 0
+    stake_per_round = stakes.sum(axis=1)
+    exact_returns = stakes @ table.table.mean(axis=0)
+    results = []
+
+    for chunk_start in range(0, len(portfolios), PORTFOLIO_CHUNK_SIZE):
+        chunk = slice(chunk_start, min(chunk_start + PORTFOLIO_CHUNK_SIZE, len(portfolios)))
+        portfolio_ids = range(chunk.start + 1, chunk.stop + 1)
+        codes = np.empty((len(portfolio_ids), num_rounds), dtype=np.uint8)
+        for row, portfolio_id in enumerate(portfolio_ids):
+            codes[row] = DiceStream(seed, portfolio_id).codes(0, num_rounds)
+        # (結果代碼 x 押注) 與 (押注 x 組合) 相乘，得到每個組合在每種結果下的總回收
+        outcome_returns = (fixed_table @ stakes[chunk].T).T
+        returns = np.take_along_axis(outcome_returns, codes.astype(np.intp), axis=1)
+        if random_bets:
+            uniforms = np.empty((len(portfolio_ids), num_rounds))
+            for bet_id in random_bets:
+                for row, portfolio_id in enumerate(portfolio_ids):
+                    uniforms[row] = DiceStream(seed, portfolio_id, lane=MULTIPLIER_LANE + bet_id).uniforms(
+                        0, num_rounds)
+                returns += stakes[chunk, bet_id, None] * table.settle(codes, bet_id, uniforms)
+
+        net = np.cumsum(returns - stake_per_round[chunk, None], axis=1)
+        for row, portfolio_id in enumerate(portfolio_ids):
+            index = chunk.start + row
+            total_staked = float(stake_per_round[index] * num_rounds)
+            total_return = float(returns[row].sum())
+            results.append({
+                "portfolio_id": portfolio_id,
+                "stake_per_round": float(stake_per_round[index]),
+                "total_staked": total_staked,
+                "total_return": total_return,
+                "rtp": total_return / total_staked if total_staked > 0 else 0,
+                "exact_rtp": float(exact_returns[index] / stake_per_round[index]) if stake_per_round[index] > 0 else 0,
+                "final_net": float(net[row, -1]) if num_rounds else 0.0,
+                "max_drawdown": float(max(0.0, -net[row].min())) if num_rounds else 0.0
+            })
+
+    total_staked = sum(r["total_staked"] for r in results)
+    total_return = sum(r["total_return"] for r in results)
+    return {
+        "results": results,
+        "overall_rtp": total_return / total_staked if total_staked > 0 else 0,
+        "num_portfolios": len(portfolios),
+        "num_rounds": num_rounds
+    }
+
+
+def _build_history(codes, bets, winnings, capital):
+    """由矩陣的一列建立與 simulate_player 相同格式的每局紀錄"""
+    dice = outcome_dice()[codes]
+    return [
+        {
+            "game": game + 1,
+            "dice": game_dice,
+            "total": sum(game_dice),
+            "bet_amount": bet,
+            "won": win > 0,
+            "winnings": win,
+            "capital": game_capital
         }
-    </script>
-</body>
-</html>
-    """)
+        for game, (game_dice, bet, win, game_capital) in enumerate(
+            zip(dice.tolist(), bets.tolist(), winnings.tolist(), capital.tolist()))
+    ]
+
+# 首頁為靜態檔案，每個 worker 啟動時讀取一次並預先壓縮
+current_dir = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(current_dir, "static", "index.html")
+
+
+class StaticPage:
+    """預先壓縮的靜態頁面
+
+    啟動時建立 gzip (與可用時的 brotli) 版本，依 Accept-Encoding 選擇，
+    並以 ETag / Last-Modified 支援條件請求 (304)。
+    """
+
+    def __init__(self, path, max_age=600):
+        with open(path, "rb") as f:
+            body = f.read()
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.last_modified = datetime.fromtimestamp(int(os.path.getmtime(path)), tz=timezone.utc)
+        self.max_age = max_age
+        self.variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(body)
+
+    def response(self, request):
+        encoding = request.accept_encodings.best_match(list(self.variants)) or "identity"
+        response = Response(self.variants[encoding], mimetype="text/html")
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.set_etag(self.etag if encoding == "identity" else f"{self.etag}-{encoding}")
+        response.last_modified = self.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response.make_conditional(request)
+
+
+index_page = StaticPage(INDEX_PATH)
 
 # Flask 路由
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return index_page.response(request)
+
+def _parse_simulation_params(data):
+    """解析並限制模擬參數，押注類型或選項無效時拋出 ValueError"""
+    seed = data.get('seed')
+    bet_type = data.get('bet_type', '高 (HI)')
+    if bet_type not in SicBoSimulator().bet_types:
+        raise ValueError(f"未知的押注類型: {bet_type}")
+    return {
+        # 限制玩家數和局數的範圍 (負數視為 0)
+        "num_players": max(0, min(int(data.get('num_players', 10)), 1000)),
+        "num_games": max(0, min(int(data.get('num_games', 100)), 10000)),
+        "bet_amount": int(data.get('bet_amount', 100)),
+        "initial_capital": int(data.get('initial_capital', 10000)),
+        "bet_type": bet_type,
+        "selection": parse_selection(bet_type, data.get('selection')),
+        "seed": int(seed) if seed is not None else None,
+    }
+
+@app.route('/bet_types', methods=['GET'])
+def list_bet_types():
+    """所有可模擬的押注類型及可指定的選項"""
+    return jsonify([
+        {"bet_type": bet_type, "description": info["description"], "selections": bet_selections(bet_type),
+         "weights": info.get("weights")}
+        for bet_type, info in SicBoSimulator().bet_types.items()
+    ])
+
+# /simulate 支援的模擬模式
+SIMULATE_MODES = ("full", "aggregate", "exact", "adaptive")
+
+
+def _instrument_simulate(view):
+    """記錄 /simulate 的請求數、處理時間、每秒模擬局數與回應大小
+
+    mode 標籤只使用 SIMULATE_MODES 與 stream，其他值記為 other，避免任意字串產生新的指標序列。
+    """
+    @functools.wraps(view)
+    def wrapper():
+        start = time.perf_counter()
+        response = view()
+        if isinstance(response, tuple):
+            response = app.make_response(response)
+        elapsed = time.perf_counter() - start
+        data = request.get_json(silent=True) or {}
+        mode = data.get('mode', 'full')
+        if mode not in SIMULATE_MODES:
+            mode = 'other'
+        if data.get('stream'):
+            mode = 'stream'
+        SIMULATE_REQUESTS.inc(mode=mode, status=response.status_code)
+        SIMULATE_SECONDS.observe(elapsed, mode=mode)
+        if not response.is_streamed:
+            RESPONSE_BYTES.observe(response.content_length or 0, mode=mode)
+            if response.status_code == 200 and mode in ('full', 'aggregate') and response.headers.get('X-Cache') != 'HIT':
+                try:
+                    rolls = min(int(data.get('num_players', 10)), 1000) * min(int(data.get('num_games', 100)), 10000)
+                    ROLLS_PER_SECOND.set(rolls / elapsed if elapsed > 0 else 0, mode=mode)
+                except (TypeError, ValueError):
+                    pass
+        return response
+    return wrapper
 
 @app.route('/simulate', methods=['POST'])
+@_instrument_simulate
 def simulate():
     data = request.get_json()
+    try:
+        params = _parse_simulation_params(data)
+        workers = max(1, min(int(data.get('workers', 1)), os.cpu_count() or 1))
+        points = int(data['points']) if data.get('points') else None
+        tolerance = float(data.get('tolerance', 0.01))
+        confidence = float(data.get('confidence', 0.95))
+        if not 0 < confidence < 1:
+            raise ValueError("confidence 必須介於 0 與 1 之間")
+        max_players = int(data.get('max_players', 100000))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    mode = data.get('mode', 'full')
+    if mode not in SIMULATE_MODES:
+        return jsonify({"error": f"不支援的模式: {mode}，可用 {', '.join(SIMULATE_MODES)}"}), 400
     
-    num_players = int(data.get('num_players', 10))
-    num_games = int(data.get('num_games', 100))
-    bet_amount = int(data.get('bet_amount', 100))
-    initial_capital = int(data.get('initial_capital', 10000))
-    bet_type = data.get('bet_type', '高 (HI)')
+    # 串流模式: 每位玩家的結果計算完成後立即送出
+    if data.get('stream') or request.accept_mimetypes.best == 'application/x-ndjson':
+        return Response(stream_with_context(stream_simulation_ndjson(**params)),
+                        mimetype='application/x-ndjson')
+    
+    # 精確模式: 以馬可夫鏈直接計算破產機率與最終資金分佈 (不需要 num_players 與 seed)
+    if mode == 'exact':
+        try:
+            return jsonify(exact_bankroll_distribution(
+                params["num_games"], params["bet_amount"], params["initial_capital"],
+                params["bet_type"], params["selection"]))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    # 自適應模式: 玩家數由 tolerance 決定 (num_players 為上限)
+    if mode == 'adaptive':
+        params = {key: value for key, value in params.items() if key != "num_players"}
+        # 玩家數上限依總局數上限換算；至少 2 位玩家才能估計變異數
+        player_budget = ADAPTIVE_MAX_GAMES // max(params["num_games"], 1)
+        return jsonify(adaptive_multiple_players(
+            **params, tolerance=tolerance, confidence=confidence,
+            max_players=max(min(max_players, player_budget), 2),
+            control_variates=bool(data.get('control_variates', False))))
     
-    # 限制最大玩家數和局數
-    num_players = min(num_players, 1000)
-    num_games = min(num_games, 10000)
+    # 指定 seed 的結果可以重現，直接使用快取
+    cache_key = None
+    if params["seed"] is not None:
+        cache_key = result_cache.make_key(**params, mode=mode, points=points,
+                                          paytable=paytable_version(SicBoSimulator().bet_types))
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return Response(cached, mimetype='application/json', headers={'X-Cache': 'HIT'})
     
     # 運行模擬
-    results = simulate_multiple_players(num_players, num_games, bet_amount, initial_capital, bet_type)
+    if mode == 'aggregate':
+        # 彙總模式: 只返回每局的平均資金、玩家數、勝率與累計RTP
+        results = aggregate_multiple_players(**params, points=points)
+    elif workers > 1:
+        results = simulate_multiple_players_parallel(**params, workers=workers)
+    else:
+        results = simulate_multiple_players_vectorized(**params)
     
+    with STAGE_SECONDS.time(stage="serialize"):
+        response = jsonify(results)
+    if cache_key is not None:
+        result_cache.put(cache_key, response.get_data())
+        response.headers['X-Cache'] = 'MISS'
+    return response
+
+@app.route('/portfolio', methods=['POST'])
+def portfolio():
+    """組合押注模擬 (每局同時押注多個選項)"""
+    data = request.get_json()
+    portfolios = data.get('portfolios', [])
+    num_rounds = min(int(data.get('num_rounds', 100)), 10000)
+    seed = data.get('seed')
+    # 限制組合數及總局數
+    if not 0 < len(portfolios) <= 5000 or len(portfolios) * num_rounds > 20_000_000:
+        return jsonify({"error": "組合數需為 1-5000，且組合數 x 局數不可超過 20,000,000"}), 400
+    try:
+        results = simulate_portfolios(portfolios, num_rounds, int(seed) if seed is not None else None)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(results)
 
+@app.route('/sweep', methods=['POST'])
+def sweep_route():
+    """參數掃描: 在賠率、押注金額、起始資金與局數的網格上一次計算所有組合"""
+    data = request.get_json()
+    try:
+        bet_type = data.get('bet_type', '高 (HI)')
+        if bet_type not in SicBoSimulator().bet_types:
+            raise ValueError(f"未知的押注類型: {bet_type}")
+        grids = {
+            "bet_amounts": [int(v) for v in data.get('bet_amounts', [100])],
+            "initial_capitals": [int(v) for v in data.get('initial_capitals', [10000])],
+            "num_games": [min(int(v), 10000) for v in data.get('num_games', [100])],
+        }
+        payouts = data.get('payouts')
+        if any(not values for values in grids.values()) or payouts == [] or min(grids["num_games"]) <= 0:
+            raise ValueError("網格不可為空，局數需大於 0")
+        points = (len(payouts) if payouts else 1) * np.prod([len(values) for values in grids.values()])
+        if points > 1000:
+            raise ValueError("網格點數不可超過 1000")
+        seed = data.get('seed')
+        results = sweep(bet_type, payouts, **grids, num_players=min(int(data.get('num_players', 100)), 1000),
+                        seed=int(seed) if seed is not None else None,
+                        selection=parse_selection(bet_type, data.get('selection')))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(results)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 文字格式的監控指標"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """結果快取的命中統計"""
+    return jsonify(result_cache.stats())
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """提交背景模擬工作，立即返回工作編號
+
+    mode: "full" (預設) 或 "aggregate"；include_history 為 false 時不返回每局歷史
+    """
+    data = request.get_json()
+    try:
+        params = _parse_simulation_params(data)
+        points = int(data['points']) if data.get('points') is not None else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    mode = data.get('mode', 'full')
+    if mode not in ("full", "aggregate"):
+        return jsonify({"error": f"不支援的工作模式: {mode}"}), 400
+    include_history = bool(data.get('include_history', True))
+    estimated_bytes = params["num_players"] * params["num_games"] * JOB_HISTORY_BYTES_PER_GAME
+    if mode == "full" and include_history and estimated_bytes > job_manager.max_result_bytes:
+        return jsonify({"error": f"含每局歷史的結果約 {estimated_bytes} bytes，超過上限 "
+                                 f"{job_manager.max_result_bytes} bytes，請使用 mode aggregate 或 include_history false"}), 400
+    job = job_manager.submit(run_simulation_job, params["num_players"], **params, mode=mode,
+                             include_history=include_history, points=points)
+    return jsonify(job.to_dict()), 202, {"Location": f"/jobs/{job.id}"}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """查詢工作進度 (progress 為已完成的玩家數，games_completed 為已完成的局數)"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "找不到工作"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """取得已完成工作的結果"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "找不到工作"}), 404
+    if job.status != "finished":
+        return jsonify(job.to_dict()), 409
+    # 工作結果已序列化為 JSON
+    return Response(job.result, mimetype="application/json")
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消工作"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "找不到工作"}), 404
+    return jsonify(job.to_dict())
+
 if __name__ == '__main__':
     # 檢查Flask是否已安裝
     try: